@@ -1,22 +1,32 @@
 import streamlit as st
 import google.generativeai as genai
 import tempfile
+import json
 import os
 from dotenv import load_dotenv
+from routing import DEFAULT_MODEL
+from diarization import SEGMENT_INSTRUCTIONS, SEGMENT_SCHEMA, normalize_segments, render_conversation
 load_dotenv()
 GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
 genai.configure(api_key=GOOGLE_API_KEY)
 def transcribe(audio_file, language):
   your_file = genai.upload_file(path=audio_file)
-  prompt = f"Listen carefully to the following audio file in {language}. This is a debate among 5 people. Provide a complete transcript in conversation style, Speaker wise "
-  model = genai.GenerativeModel('models/gemini-1.5-flash')
+  prompt = f"Listen carefully to the following audio file in {language}. This is a debate among 5 people. Provide a complete transcript in conversation style, Speaker wise, as {SEGMENT_INSTRUCTIONS}."
+  model = genai.GenerativeModel(DEFAULT_MODEL, generation_config={
+    "response_mime_type": "application/json",
+    "response_schema": SEGMENT_SCHEMA,
+  })
   response = model.generate_content([prompt, your_file])
-  return response.text
+  try:
+    return render_conversation(normalize_segments(json.loads(response.text)))
+  except ValueError:
+    # Cut-off or malformed JSON: show what the model did return
+    return response.text
 
 def translate(audio_file, language):
   your_file = genai.upload_file(path=audio_file)
   prompt = f"Listen carefully to the following audio file in {language}. Translate it to English."
-  model = genai.GenerativeModel('models/gemini-1.5-flash')
+  model = genai.GenerativeModel(DEFAULT_MODEL)
   response = model.generate_content([prompt, your_file])
   return response.text
 
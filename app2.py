@@ -4,20 +4,21 @@ import google.generativeai as genai
 import tempfile
 import os
 from dotenv import load_dotenv
+from routing import DEFAULT_MODEL
 load_dotenv()
 GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
 genai.configure(api_key=GOOGLE_API_KEY)
 def transcribe(audio_file, language, format_type):
   your_file = genai.upload_file(path=audio_file)
   prompt = f"Listen carefully to the following audio file in {language}. Provide a complete transcript in {format_type} format."
-  model = genai.GenerativeModel('models/gemini-1.5-flash')
+  model = genai.GenerativeModel(DEFAULT_MODEL)
   response = model.generate_content([prompt, your_file])
   return response.text
 
 def translate(audio_file, language, format_type):
   your_file = genai.upload_file(path=audio_file)
   prompt = f"Listen carefully to the following audio file in {language}. Translate it to English in {format_type} format."
-  model = genai.GenerativeModel('models/gemini-1.5-flash')
+  model = genai.GenerativeModel(DEFAULT_MODEL)
   response = model.generate_content([prompt, your_file])
   return response.text
 
@@ -1,91 +1,24 @@
 import streamlit as st
-import google.generativeai as genai
-import tempfile
+import hashlib
 import os
-import pandas as pd
-from dotenv import load_dotenv
+import time
 from datetime import datetime
-from textblob import TextBlob
-import mimetypes
-
-# Load environment variables
-load_dotenv()
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+from transcode import CODECS, DEFAULT_BITRATE
+from sentiment import score_segments, label_for
+from chunking import format_timestamp
+from pipeline import (
+    MAX_WORKERS, CHUNK_THRESHOLD_MS, MODEL_QUALITY, QUALITY_LEVELS, FORMAT_OPTIONS, TASK_OPTIONS, AUDIO_EXTENSIONS,
+    get_result_cache, get_results_store, get_job_queue, get_scheduler, get_router, get_metrics, peak_rss_mb, preflight,
+    result_entries, search_results, speaker_segments, new_live_session, save_live_session, transcribe_audio,
+    save_results_to_excel, save_results_to_text, save_results_to_zip
+)
 
 # ---------------------------- Utility Functions ---------------------------- #
 
-def analyze_sentiment(text):
-    """Analyze sentiment using TextBlob."""
-    blob = TextBlob(text)
-    polarity = blob.sentiment.polarity
-    subjectivity = blob.sentiment.subjectivity
-
-    if polarity > 0.1:
-        return "Positive"
-    elif polarity < -0.1:
-        return "Negative"
-    else:
-        return "Neutral" if subjectivity < 0.3 else "Mixed"
-
-
-def save_results_to_excel(data):
-    """Save results to an Excel file."""
-    today_date = datetime.now().strftime("%m_%d_%y")
-    results_filename = f"Results_of_{today_date}.xlsx"
-
-    if os.path.exists(results_filename):
-        existing_data = pd.read_excel(results_filename)
-        new_data = pd.concat([existing_data, pd.DataFrame(data)], ignore_index=True)
-    else:
-        new_data = pd.DataFrame(data)
-
-    new_data.to_excel(results_filename, index=False)
-    return results_filename
-
-
-def save_results_to_text(data):
-    """Save results to a text file."""
-    today_date = datetime.now().strftime("%m_%d_%y")
-    results_filename = f"Results_of_{today_date}.txt"
-
-    with open(results_filename, "w", encoding="utf-8") as file:
-        for entry in data:
-            file.write(f"Audio File Name: {entry['Audio File Name']}\n")
-            file.write(f"Transcript/Translation: {entry['Transcript/Translation']}\n")
-            file.write(f"Format Chosen: {entry['Format Chosen']}\n")
-            file.write(f"Sentiment: {entry['Sentiment']}\n")
-            file.write("\n" + "-" * 60 + "\n\n")
-
-    return results_filename
-
-
 def process_audio(audio_path, format_type, option):
     """Transcribe or translate the given audio file."""
     try:
-        # Detect MIME type
-        mime_type, _ = mimetypes.guess_type(audio_path)
-        if not mime_type:
-            mime_type = "audio/wav"
-
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
-
-        if option == "Transcribe":
-            prompt = f"Act as a speech recognition expert. Provide a complete transcript in {format_type} format."
-        else:
-            prompt = f"Translate the following audio to English in {format_type} format."
-
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
-        response = model.generate_content(
-            [
-                prompt,
-                {"mime_type": mime_type, "data": audio_bytes}
-            ]
-        )
-
-        return response.text.strip() if response.text else "No output generated."
-
+        return transcribe_audio(audio_path, format_type, option)
     except Exception as e:
         st.error(f"Error processing {os.path.basename(audio_path)}: {e}")
         return None
@@ -95,7 +28,6 @@ def process_audio(audio_path, format_type, option):
 
 def main():
     st.set_page_config(page_title="Audio Transcription & Translation", page_icon="🎧", layout="wide")
-    st.title("🎧 Audio Transcription 📝 & Translation ▶️")
 
     # Sidebar Information
     with st.sidebar:
@@ -108,68 +40,409 @@ def main():
         st.image("https://www.lbsnaa.gov.in/admin_assets/images/logo.png", use_container_width=True)
         st.header("📩 Feedback")
         st.write("nictu@lbsnaa.gov.in")
+        st.divider()
+        cache_stats = get_result_cache().stats()
+        st.caption(f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        archive_stats = get_results_store().archive_stats()
+        st.caption(
+            f"Transcript archive: {archive_stats['transcripts']} unique transcripts "
+            f"for {archive_stats['rows']} results, "
+            f"{archive_stats['raw_bytes'] / 1e6:.1f} MB stored in {archive_stats['stored_bytes'] / 1e6:.1f} MB, "
+            f"plus {archive_stats['index_bytes'] / 1e6:.1f} MB of search index"
+        )
+        rss = peak_rss_mb()
+        if rss is not None:
+            st.caption(f"Peak memory: {rss} MB")
+        latency = get_router().stats()
+        for model_name, quota in get_scheduler().stats().items():
+            speed = latency.get(model_name)
+            st.caption(
+                f"{model_name}: {quota['requests']} requests, {quota['retries']} retries, "
+                f"{quota['failures']} failures, {quota['tokens']} tokens, "
+                f"{quota['throttled_seconds']}s throttled, circuit {quota['circuit']}"
+                + (f", {speed['seconds_per_1k_tokens']}s per 1k tokens" if speed else "")
+            )
+
+    page = st.navigation([
+        st.Page(transcribe_page, title="Transcribe", icon="🎧", default=True),
+        st.Page(live_page, title="Live microphone", icon="🎙️"),
+        st.Page(search_page, title="Search transcripts", icon="🔎"),
+    ])
+    page.run()
+
+
+def transcribe_page():
+    st.title("🎧 Audio Transcription 📝 & Translation ▶️")
 
     audio_files = st.file_uploader(
         "Upload one or more audio files",
         accept_multiple_files=True,
-        type=["wav", "mp3", "flac", "ogg", "m4a"]
+        type=AUDIO_EXTENSIONS
     )
 
     if audio_files:
-        format_options = [
-            "Conversation style (identify speakers)",
-            "Paragraph",
-            "Bullet points",
-            "Summary"
-        ]
-        selected_format = st.selectbox("Choose output format:", format_options)
-        option = st.radio("Choose task:", ["Transcribe", "Translate"], horizontal=True)
-
-        if st.button("🚀 Process All Files"):
-            results_data = []
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            for idx, audio_file in enumerate(audio_files):
-                try:
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-                        tmp.write(audio_file.read())
-                        audio_path = tmp.name
-
-                    status_text.text(f"Processing {audio_file.name} ...")
-                    result_text = process_audio(audio_path, selected_format, option)
-
-                    if result_text:
-                        sentiment = analyze_sentiment(result_text)
-                        results_data.append({
-                            "Audio File Name": audio_file.name,
-                            "Transcript/Translation": result_text,
-                            "Format Chosen": selected_format,
-                            "Sentiment": sentiment
-                        })
-
-                    progress_bar.progress(int(((idx + 1) / len(audio_files)) * 100))
-
-                except Exception as e:
-                    st.error(f"An error occurred with file {audio_file.name}: {e}")
-
-            status_text.text("✅ Processing complete!")
-
-            # Save Results
-            if results_data:
-                saved_excel = save_results_to_excel(results_data)
-                saved_text = save_results_to_text(results_data)
-
-                st.success(f"Results saved to `{saved_excel}` and `{saved_text}`.")
-
-                col1, col2 = st.columns(2)
-                with col1:
-                    with open(saved_excel, "rb") as f:
-                        st.download_button("📊 Download Excel Results", f, file_name=saved_excel)
-                with col2:
-                    with open(saved_text, "rb") as f:
-                        st.download_button("📄 Download Text Results", f, file_name=saved_text)
+        selected_formats = st.multiselect("Choose output formats:", FORMAT_OPTIONS, default=FORMAT_OPTIONS[:1])
+        options = st.multiselect("Choose tasks:", TASK_OPTIONS, default=TASK_OPTIONS[:1])
+        # Every combination comes back from one pass over each file's audio
+        outputs = [(option, selected_format) for option in options for selected_format in selected_formats]
+        max_workers = st.slider("Segments of a long recording transcribed in parallel:", 1, 16, MAX_WORKERS)
+        split_long = st.checkbox(
+            f"Split recordings longer than {CHUNK_THRESHOLD_MS // 60000} minutes at silences",
+            value=True
+        )
+        stream_output = st.checkbox("Show transcripts as they are generated", value=True)
+        quality = st.select_slider(
+            "Model quality:", list(QUALITY_LEVELS), value=MODEL_QUALITY,
+            help="Fast sends more files to smaller models; Best sends everything to the strongest one."
+        )
+        with st.expander("Audio preprocessing"):
+            vad = st.checkbox("Cut long silences before sending", value=False)
+            dedupe = st.checkbox(
+                "Reuse transcripts of recordings already processed (re-encoded, trimmed or extended copies)",
+                value=True
+            )
+            compress_audio = st.checkbox("Convert to mono 16 kHz before sending", value=True)
+            codec = st.selectbox("Codec:", list(CODECS))
+            bitrate = st.select_slider("Opus bitrate:", ["16k", "24k", "32k", "48k", "64k"], value=DEFAULT_BITRATE)
+
+        if not outputs:
+            st.warning("Choose at least one output format and task.")
+        else:
+            split_long = render_preflight(audio_files, outputs, split_long, max_workers)
+
+        if outputs and st.button("🚀 Process All Files"):
+            with get_metrics().span("temp_write", nbytes=sum(audio_file.size for audio_file in audio_files)):
+                job_id = get_job_queue().submit(
+                    [(audio_file.name, audio_file) for audio_file in audio_files],
+                    {
+                        "outputs": outputs,
+                        "max_workers": max_workers,
+                        "split_long": split_long,
+                        "stream": stream_output,
+                        "vad": vad,
+                        "dedupe": dedupe,
+                        "quality": quality,
+                        "compress": compress_audio,
+                        "codec": codec,
+                        "bitrate": bitrate,
+                    }
+                )
+            # Kept in the URL as well so a refreshed or reopened tab finds the job again
+            st.session_state["job_id"] = job_id
+            st.query_params["job"] = job_id
+
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    if job_id:
+        status = get_job_queue().status(job_id)
+        if status is None:
+            st.warning(f"Job `{job_id}` was not found.")
+        elif status["finished"]:
+            render_job_results(job_id, status)
+        else:
+            render_job_progress(job_id)
+
+    render_downloads()
 
 
+def live_page():
+    """Record from the microphone; each clip is transcribed in overlapping windows as it arrives."""
+    st.title("🎙️ Live Transcription")
+    try:
+        from audiorecorder import audiorecorder
+    except ImportError:
+        st.error("Live mode needs the streamlit-audiorecorder package.")
+        return
+
+    session = st.session_state.get("live_session")
+    active = session is not None and not session.finished
+    selected_format = st.selectbox("Choose output format:", FORMAT_OPTIONS, disabled=active)
+    option = st.radio("Choose task:", TASK_OPTIONS, horizontal=True, disabled=active)
+
+    if not active:
+        if st.button("▶️ Start session"):
+            st.session_state["live_session"] = new_live_session(selected_format, option)
+            st.session_state["live_settings"] = (selected_format, datetime.now())
+            st.session_state.pop("live_clip", None)
+            st.session_state.pop("live_saved", None)
+            st.rerun()
+    else:
+        st.caption(
+            "Each recording is cut into 30-second windows that are transcribed as soon as the clip stops. "
+            "Stop and start again at natural pauses to keep the transcript close behind you."
+        )
+        clip = audiorecorder("⏺️ Record", "⏹️ Stop")
+        if len(clip):
+            # The widget returns the last clip on every rerun; only feed a clip once
+            digest = hashlib.sha1(clip.raw_data).hexdigest()
+            if digest != st.session_state.get("live_clip"):
+                st.session_state["live_clip"] = digest
+                session.feed(clip)
+        if st.button("⏹️ End session"):
+            session.finish()
+            st.rerun()
+
+    if session is not None:
+        render_live_transcript(session)
+
+
+@st.fragment(run_every=2)
+def render_live_transcript(session):
+    """Show the transcript of the live session as windows finish."""
+    status = session.status()
+    st.text(
+        f"{status['captured_ms'] / 60000:.1f} min captured, {status['done']} of {status['sent']} windows "
+        f"transcribed" + (f", {status['failed']} failed" if status["failed"] else "")
+    )
+    for error in session.errors():
+        st.error(error)
+    st.markdown(session.text() or "_Waiting for audio…_")
+
+    if status["finished"] and status["done"] == status["sent"] and not st.session_state.get("live_saved"):
+        if st.button("💾 Save to today's results"):
+            format_type, started = st.session_state["live_settings"]
+            save_live_session(session, f"Live session {started:%Y-%m-%d %H:%M}", format_type)
+            st.session_state["live_saved"] = True
+            st.success("Live session saved.")
+
+
+def search_page():
+    """Full-text search over every saved transcript."""
+    st.title("🔎 Search Transcripts")
+    query = st.text_input(
+        "Search for words or phrases:",
+        placeholder='e.g. budget review, "training schedule", evaluat*'
+    )
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        days = st.multiselect("Days:", get_results_store().days())
+    with col2:
+        formats = st.multiselect("Formats:", get_results_store().formats())
+    with col3:
+        sentiments = st.multiselect("Sentiment:", ["Positive", "Negative", "Neutral", "Mixed"])
+    if not query:
+        return
+
+    start = time.perf_counter()
+    hits = search_results(query, days=days, formats=formats, sentiments=sentiments)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    st.caption(f"{len(hits)} matching segments in {elapsed_ms:.0f} ms")
+    for hit in hits:
+        where = " · ".join(
+            str(part) for part in (hit["day"].replace("_", "/"), hit["Format Chosen"], hit["Sentiment"],
+                                   hit["speaker"], hit["timestamp"]) if part
+        )
+        st.markdown(f"**{hit['Audio File Name']}** — {where}\n\n{hit['snippet']}")
+
+
+def render_preflight(audio_files, outputs, split_long, max_workers):
+    """Show estimated duration, tokens and time per file; returns the split setting to use."""
+    with get_metrics().span("preflight"):
+        rows, totals = preflight(
+            [(audio_file.name, audio_file) for audio_file in audio_files],
+            outputs, split_long, max_workers
+        )
+    st.dataframe([
+        {
+            "Audio File Name": row["name"],
+            "Duration": f"{row['duration_ms'] // 60000}:{row['duration_ms'] // 1000 % 60:02d}"
+                        + ("" if row["probed"] else " (guess)"),
+            "Sample rate (Hz)": row["sample_rate"],
+            "Channels": row["channels"],
+            "Size (MB)": round(row["size_bytes"] / (1024 * 1024), 1),
+            "Requests": row["requests"],
+            "Est. input tokens": row["input_tokens"],
+            "Est. output tokens": row["output_tokens"],
+            "Split": row["split"],
+        }
+        for row in rows
+    ], hide_index=True)
+    minutes, seconds = divmod(int(totals["seconds"]), 60)
+    st.caption(
+        f"Estimate: {totals['duration_ms'] / 60000:.1f} min of audio, {totals['requests']} requests, "
+        f"~{totals['input_tokens'] + totals['output_tokens']:,} tokens, about {minutes}m {seconds:02d}s"
+    )
+    if totals["needs_split"]:
+        st.warning("Some files are too long for a single request and will be split at silences.")
+        return True
+    return split_long
+
+
+@st.fragment(run_every=2)
+def render_job_progress(job_id):
+    """Poll the job queue and show progress and partial transcripts."""
+    status = get_job_queue().status(job_id)
+    if status["finished"]:
+        st.rerun()
+
+    st.progress(int(((status["done"] + status["failed"]) / status["total"]) * 100))
+    st.text(
+        f"Job {job_id[:8]}: {status['done']} done, {status['failed']} failed, "
+        f"{status['running']} running, {status['queued']} queued of {status['total']} files"
+    )
+    for row in get_job_queue().files(job_id):
+        with st.expander(f"{row['name']} — {row['status']}", expanded=row["status"] == "running"):
+            if row["result"]:
+                render_entries(result_entries(row["result"]))
+            elif row["error"]:
+                st.error(row["error"])
+            elif row["partial_text"]:
+                st.markdown(row["partial_text"])
+
+
+def render_entries(entries):
+    """Show a file's outputs, headed by their format when there are several."""
+    for entry in entries:
+        if len(entries) > 1:
+            st.markdown(f"**{entry['Format Chosen']}**")
+        st.markdown(entry["Transcript/Translation"])
+
+
+def render_job_results(job_id, status):
+    """Show the outcome of a finished job."""
+    # Only needed once a job has finished, so plain reruns skip loading pandas
+    import pandas as pd
+
+    rows = get_job_queue().files(job_id)
+    results_data = [entry for row in rows if row["result"] for entry in result_entries(row["result"])]
+    for row in rows:
+        if row["error"]:
+            st.error(f"Error processing {row['name']}: {row['error']}")
+        elif row["result"] and status["settings"]["stream"]:
+            with st.expander(row["name"]):
+                render_entries(result_entries(row["result"]))
+
+    cache_stats = get_result_cache().stats()
+    st.text(f"✅ Processing complete! Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
+    size_rows = [
+        (row["name"], *row["result"]["sizes"]) for row in rows if row["result"] and row["result"]["sizes"]
+    ]
+    if size_rows:
+        st.dataframe([
+            {
+                "Audio File Name": name,
+                "Original (KB)": round(before / 1024, 1),
+                "Sent (KB)": round(after / 1024, 1),
+                "Reduction": f"{(1 - after / before) * 100:.0f}%" if before else "0%"
+            }
+            for name, before, after in size_rows
+        ], hide_index=True)
+
+    vad_rows = [(row["name"], row["result"]["vad"]) for row in rows if row["result"] and row["result"].get("vad")]
+    if vad_rows:
+        st.dataframe([
+            {
+                "Audio File Name": name,
+                "Original (min)": round(report["original_ms"] / 60000, 1),
+                "Sent (min)": round(report["kept_ms"] / 60000, 1),
+                "Silence removed": f"{report['removed_pct']:.0f}%"
+            }
+            for name, report in vad_rows
+        ], hide_index=True)
+
+    duplicate_rows = [
+        (row["name"], row["result"]["duplicate"]) for row in rows if row["result"] and row["result"].get("duplicate")
+    ]
+    if duplicate_rows:
+        st.dataframe([
+            {
+                "Audio File Name": name,
+                "Matches": match["name"],
+                "Overlap": f"{match['coverage_pct']}%",
+                "Reused": "Whole transcript" if match["reused"] == "all" else "Overlap only; the rest was transcribed"
+            }
+            for name, match in duplicate_rows
+        ], hide_index=True)
+
+    timing_rows = [
+        {"Audio File Name": row["name"], **timing}
+        for row in rows if row["result"] for timing in row["result"].get("timings", [])
+    ]
+    if timing_rows:
+        with st.expander("Timing by stage"):
+            timings_df = pd.DataFrame(timing_rows)
+            batch_df = (
+                timings_df.groupby("stage", as_index=False)
+                .agg(spans=("count", "sum"), seconds=("seconds", "sum"), bytes=("bytes", "sum"),
+                     tokens=("tokens", "sum"))
+                .sort_values("seconds", ascending=False)
+            )
+            st.dataframe(batch_df, hide_index=True)
+            st.dataframe(timings_df, hide_index=True)
+
+    # Conversation-style results have stored speaker segments; only the others are split and scored here
+    tables = {}
+    for i, entry in enumerate(results_data):
+        table = speaker_segments(entry["Result ID"]) if entry.get("Result ID") else None
+        if table is not None:
+            tables[i] = table
+    segment_rows = score_segments([
+        "" if i in tables else entry["Transcript/Translation"] for i, entry in enumerate(results_data)
+    ])
+    speaker_rows = []
+    for i, table in tables.items():
+        segment_rows += [
+            {"file_index": i, "segment": row["segment"], "speaker": row["speaker"],
+             "timestamp": format_timestamp(row["start_ms"]) if row["start_ms"] >= 0 else None,
+             "polarity": row["polarity"], "subjectivity": row["subjectivity"], "sentiment": row["sentiment"]}
+            for row in table.rows()
+        ]
+        speaker_rows += [{"file_index": i, **stats} for stats in table.speaker_stats()]
+    if segment_rows:
+        with st.expander("Sentiment by speaker and segment"):
+            segments_df = pd.DataFrame(segment_rows)
+            segments_df["Audio File Name"] = [
+                results_data[i]["Audio File Name"] for i in segments_df["file_index"]
+            ]
+            segments_df["Format Chosen"] = [results_data[i]["Format Chosen"] for i in segments_df["file_index"]]
+            speakers_df = (
+                segments_df[~segments_df["file_index"].isin(tables)].dropna(subset=["speaker"])
+                .groupby(["Audio File Name", "Format Chosen", "speaker"], as_index=False)
+                .agg(segments=("segment", "count"), polarity=("polarity", "mean"),
+                     subjectivity=("subjectivity", "mean"))
+            )
+            if not speakers_df.empty:
+                speakers_df["sentiment"] = [
+                    label_for(p, s) for p, s in zip(speakers_df["polarity"], speakers_df["subjectivity"])
+                ]
+            if speaker_rows:
+                stored_df = pd.DataFrame(speaker_rows)
+                for position, column in enumerate(("Audio File Name", "Format Chosen")):
+                    stored_df.insert(position, column, [results_data[i][column] for i in stored_df["file_index"]])
+                speakers_df = pd.concat([speakers_df, stored_df.drop(columns=["file_index"])], ignore_index=True)
+            if not speakers_df.empty:
+                st.dataframe(speakers_df, hide_index=True)
+            st.dataframe(segments_df.drop(columns=["file_index"]), hide_index=True)
+
+    if results_data:
+        st.success(f"{len(results_data)} results saved. Download today's results below.")
+
+
+def render_downloads():
+    """Offer today's results; each file is brought up to date only when asked for."""
+    count = get_results_store().count()
+    if not count:
+        return
+
+    st.divider()
+    st.subheader(f"📥 Today's results ({count} files)")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("📊 Prepare Excel Results"):
+            saved_excel = save_results_to_excel()
+            with open(saved_excel, "rb") as f:
+                st.download_button("📊 Download Excel Results", f, file_name=saved_excel)
+    # Text and ZIP only append rows saved since they were last prepared
+    with col2:
+        if st.button("📄 Prepare Text Results"):
+            saved_text = save_results_to_text()
+            with open(saved_text, "rb") as f:
+                st.download_button("📄 Download Text Results", f, file_name=saved_text)
+    with col3:
+        if st.button("🗂️ Prepare TXT per File (ZIP)"):
+            saved_zip = save_results_to_zip()
+            with open(saved_zip, "rb") as f:
+                st.download_button("🗂️ Download TXT per File (ZIP)", f, file_name=saved_zip)
+
 if __name__ == "__main__":
     main()
@@ -7,19 +7,27 @@ import time
 import os
 import pandas as pd
 from dotenv import load_dotenv
+from routing import DEFAULT_MODEL
 from datetime import datetime
 from textblob import TextBlob
+import mimetypes
+from transport import build_audio_part
 
 load_dotenv()
 GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
 genai.configure(api_key=GOOGLE_API_KEY)
 
+# Build the audio part, reusing an earlier upload of the same file
+def audio_part_for(audio_file):
+    mime_type, _ = mimetypes.guess_type(audio_file)
+    return build_audio_part(audio_file, mime_type or "audio/wav")
+
 # Function to process transcription
 def transcribe(audio_file, format_type):
     try:
-        your_file = genai.upload_file(path=audio_file)
+        your_file = audio_part_for(audio_file)
         prompt = f"Act as a speech recognizer expert. Listen carefully to the following audio file. Provide a complete transcript in {format_type} format."
-        model = genai.GenerativeModel('models/gemini-1.5-flash')
+        model = genai.GenerativeModel(DEFAULT_MODEL)
         response = model.generate_content([prompt, your_file])
         return response.text
     except RuntimeError as e:
@@ -32,9 +40,9 @@ def transcribe(audio_file, format_type):
 # Function to process translation
 def translate(audio_file, format_type):
     try:
-        your_file = genai.upload_file(path=audio_file)
+        your_file = audio_part_for(audio_file)
         prompt = f"Listen carefully to the following audio file. Translate it to English in {format_type} format."
-        model = genai.GenerativeModel('models/gemini-1.5-flash')
+        model = genai.GenerativeModel(DEFAULT_MODEL)
         response = model.generate_content([prompt, your_file])
         return response.text
     except RuntimeError as e:
@@ -0,0 +1,142 @@
+"""Content-addressed, compressed storage for transcripts inside the results database.
+
+Each distinct transcript is stored once, keyed by its SHA-256, and
+compressed on its own with zlib. So any one can be read back without
+touching the rest. Once enough transcripts exist, a shared preset dictionary
+of their most common phrases is built. Transcripts are short and repetitive
+across files (speaker labels, timestamps, stock phrases), so the dictionary
+makes up for most of what per-transcript compression loses.
+"""
+import hashlib
+import re
+import zlib
+from collections import Counter
+
+# zlib preset dictionaries can be at most 32 KB
+MAX_DICTIONARY_BYTES = 32 * 1024
+# Transcripts stored before the dictionary is built from them
+DICTIONARY_SAMPLES = 64
+COMPRESSION_LEVEL = 9
+PHRASE_WORDS = 4
+
+
+def create_archive(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_blobs (
+            hash TEXT PRIMARY KEY,
+            dictionary_id INTEGER,
+            raw_size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS archive_dictionaries (id INTEGER PRIMARY KEY AUTOINCREMENT, data BLOB)")
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _compress(raw, dictionary=None):
+    if dictionary:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def _decompress(data, dictionary=None):
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def decode(data, dictionary=None):
+    """Text of one stored blob, given the dictionary it was compressed with."""
+    return _decompress(data, dictionary).decode("utf-8")
+
+
+def current_dictionary(conn):
+    """(id, bytes) of the newest shared dictionary, or (None, None)."""
+    row = conn.execute("SELECT id, data FROM archive_dictionaries ORDER BY id DESC LIMIT 1").fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def build_dictionary(texts):
+    """Preset dictionary of the phrases that recur most across `texts`.
+
+    zlib matches nearer the end of the dictionary more cheaply, so the most
+    common phrases go last.
+    """
+    counts = Counter()
+    for text in texts:
+        words = re.findall(r"\S+", text)
+        # Count each phrase once per transcript so one long file cannot dominate
+        counts.update({" ".join(words[i:i + PHRASE_WORDS]) for i in range(len(words) - PHRASE_WORDS + 1)})
+    phrases, size = [], 0
+    for phrase, count in counts.most_common():
+        if count < 2 or size >= MAX_DICTIONARY_BYTES:
+            break
+        phrases.append(phrase)
+        size += len(phrase.encode("utf-8")) + 1
+    return " ".join(reversed(phrases)).encode("utf-8")[-MAX_DICTIONARY_BYTES:]
+
+
+def maybe_build_dictionary(conn):
+    """Build the shared dictionary once DICTIONARY_SAMPLES transcripts exist, then recompress those."""
+    if current_dictionary(conn)[0] is not None:
+        return
+    rows = conn.execute("SELECT hash, data FROM archive_blobs WHERE dictionary_id IS NULL").fetchall()
+    if len(rows) < DICTIONARY_SAMPLES:
+        return
+    texts = {blob_hash: _decompress(data).decode("utf-8") for blob_hash, data in rows}
+    dictionary = build_dictionary(texts.values())
+    if not dictionary:
+        return
+    dictionary_id = conn.execute("INSERT INTO archive_dictionaries (data) VALUES (?)", (dictionary,)).lastrowid
+    conn.executemany(
+        "UPDATE archive_blobs SET dictionary_id = ?, data = ? WHERE hash = ?",
+        [(dictionary_id, _compress(text.encode("utf-8"), dictionary), blob_hash) for blob_hash, text in texts.items()]
+    )
+
+
+def put(conn, text):
+    """Store `text` unless an identical one is already stored; returns its hash.
+
+    Another connection may store the same text between the check and the
+    insert, so the insert ignores a blob that is already there.
+    """
+    blob_hash = content_hash(text)
+    if conn.execute("SELECT 1 FROM archive_blobs WHERE hash = ?", (blob_hash,)).fetchone() is None:
+        dictionary_id, dictionary = current_dictionary(conn)
+        raw = text.encode("utf-8")
+        conn.execute(
+            "INSERT OR IGNORE INTO archive_blobs (hash, dictionary_id, raw_size, data) VALUES (?, ?, ?, ?)",
+            (blob_hash, dictionary_id, len(raw), _compress(raw, dictionary))
+        )
+    return blob_hash
+
+
+def get_many(conn, hashes):
+    """Texts for the given hashes, each decompressed on its own."""
+    hashes = list(set(hashes))
+    if not hashes:
+        return {}
+    rows = conn.execute(
+        f"SELECT hash, dictionary_id, data FROM archive_blobs WHERE hash IN ({', '.join('?' * len(hashes))})",
+        hashes
+    ).fetchall()
+    dictionary_ids = {row[1] for row in rows if row[1] is not None}
+    dictionaries = dict(conn.execute(
+        f"SELECT id, data FROM archive_dictionaries WHERE id IN ({', '.join('?' * len(dictionary_ids))})",
+        list(dictionary_ids)
+    ).fetchall()) if dictionary_ids else {}
+    return {blob_hash: decode(data, dictionaries.get(dictionary_id)) for blob_hash, dictionary_id, data in rows}
+
+
+def stats(conn):
+    """Number of stored transcripts and their raw and compressed sizes in bytes."""
+    blobs, raw_bytes, stored_bytes = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM archive_blobs"
+    ).fetchone()
+    return {"transcripts": blobs, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
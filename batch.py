@@ -0,0 +1,47 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Number of files processed at the same time when the caller does not say
+DEFAULT_MAX_WORKERS = 4
+
+
+def run_batch(items, worker, max_workers=DEFAULT_MAX_WORKERS, on_complete=None,
+              on_tick=None, tick_interval=0.25):
+    """Run `worker` over `items` with bounded concurrency.
+
+    Results are returned in the same order as `items`. A worker that raises
+    leaves its exception in the result slot instead of aborting the batch.
+    `on_complete(index, done_count, result)` is called from the calling thread
+    as each item finishes, so it is safe to update Streamlit widgets from it.
+    `on_tick()` is also called from the calling thread every `tick_interval`
+    seconds while work is pending, for rendering partial output. Workers run
+    in a copy of the caller's context, so context variables carry over.
+    """
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    max_workers = max(1, min(int(max_workers), len(items)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, worker, item): idx
+            for idx, item in enumerate(items)
+        }
+        pending = set(futures)
+        done = 0
+        while pending:
+            finished, pending = wait(pending, timeout=tick_interval if on_tick else None,
+                                     return_when=FIRST_COMPLETED)
+            if on_tick:
+                on_tick()
+            for future in finished:
+                idx = futures[future]
+                done += 1
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    results[idx] = e
+                if on_complete:
+                    on_complete(idx, done, results[idx])
+
+    return results
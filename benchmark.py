@@ -0,0 +1,202 @@
+"""Benchmark the transcription pipeline against a local stand-in for Gemini.
+
+No API quota is used: genai.GenerativeModel and genai.upload_file are
+replaced by fakes with configurable latency, error rate and response size.
+
+Example:
+    python benchmark.py --batch-sizes 1 8 32 --audio-seconds 30 300 --workers 8 --latency 0.5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+from types import SimpleNamespace
+
+# Keep the benchmark's cache, results, jobs and exports away from the real ones. Anything
+# the pipeline writes relative to the working directory (Excel exports, their .state files,
+# metrics, a legacy workbook it would import) lands in the temp dir as well.
+_ORIGINAL_CWD = os.getcwd()
+_WORKDIR = tempfile.mkdtemp(prefix="transcribe_bench_")
+os.chdir(_WORKDIR)
+os.environ.setdefault("RESULT_CACHE_DIR", os.path.join(_WORKDIR, "cache"))
+os.environ.setdefault("RESULTS_DB", os.path.join(_WORKDIR, "results.db"))
+os.environ.setdefault("JOBS_DB", os.path.join(_WORKDIR, "jobs.db"))
+os.environ.setdefault("JOBS_DIR", os.path.join(_WORKDIR, "jobs"))
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+
+import pipeline
+from batch import run_batch
+from sentiment import analyze_sentiments
+
+WORDS = "the committee reviewed the proposal and agreed that the training was good but too long".split()
+
+
+class FakeResponse:
+    def __init__(self, text, tokens):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = SimpleNamespace(total_token_count=tokens)
+
+
+class FakeStream:
+    """Iterates over response chunks and exposes the joined text afterwards, like the SDK."""
+
+    def __init__(self, text, tokens, chunk_words=20, chunk_delay=0.0):
+        words = text.split(" ")
+        self._chunks = [" ".join(words[i:i + chunk_words]) + " " for i in range(0, len(words), chunk_words)]
+        self._chunk_delay = chunk_delay
+        self.text = text
+        self.usage_metadata = SimpleNamespace(total_token_count=tokens)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._chunk_delay)
+            yield FakeResponse(chunk, 0)
+
+
+def make_fake_model(latency, jitter, error_rate, response_words):
+    """Build a GenerativeModel replacement with the given behaviour."""
+
+    class FakeGenerativeModel:
+        def __init__(self, model_name, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, contents, stream=False, **kwargs):
+            delay = max(0.0, random.gauss(latency, jitter))
+            if random.random() < error_rate:
+                from google.api_core import exceptions as api_exceptions
+
+                time.sleep(delay / 4)
+                raise api_exceptions.ResourceExhausted("fake quota exhausted")
+            text = " ".join(random.choice(WORDS) for _ in range(response_words))
+            tokens = response_words * 2
+            if stream:
+                time.sleep(delay / 4)
+                return FakeStream(text, tokens, chunk_delay=delay * 0.75 / max(1, response_words // 20))
+            time.sleep(delay)
+            return FakeResponse(text, tokens)
+
+    return FakeGenerativeModel
+
+
+def fake_upload_file(path, mime_type=None, **kwargs):
+    return SimpleNamespace(name=f"files/{os.path.basename(path)}", display_name=path, state=None)
+
+
+def write_noise_wav(path, seconds, sample_rate=16000):
+    """Write a mono 16-bit WAV of random noise so every file hashes differently."""
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(os.urandom(int(seconds * sample_rate) * 2))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_case(batch_size, audio_seconds, workers, stream):
+    """Process `batch_size` fresh files and measure throughput, latency, memory and export time."""
+    paths = []
+    for i in range(batch_size):
+        path = os.path.join(_WORKDIR, f"bench_{audio_seconds}s_{i}_{time.time_ns()}.wav")
+        write_noise_wav(path, audio_seconds)
+        paths.append(path)
+
+    latencies = []
+
+    def process(path):
+        start = time.perf_counter()
+        entries, _ = pipeline.process_file(
+            os.path.basename(path), path, [("Transcribe", "Paragraph")],
+            split_long=False, max_workers=workers, on_chunk=(lambda text: None) if stream else None
+        )
+        latencies.append(time.perf_counter() - start)
+        return entries[0]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = run_batch(paths, process, max_workers=workers)
+    elapsed = time.perf_counter() - start
+
+    entries = [r for r in results if not isinstance(r, Exception)]
+    for entry, label in zip(entries, analyze_sentiments([e["Transcript/Translation"] for e in entries])):
+        entry["Sentiment"] = label
+
+    export_start = time.perf_counter()
+    pipeline.save_results(entries)
+    excel_path = pipeline.save_results_to_excel()
+    export_seconds = time.perf_counter() - export_start
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    for path in paths + [excel_path]:
+        os.remove(path)
+
+    return {
+        "batch_size": batch_size,
+        "audio_seconds": audio_seconds,
+        "workers": workers,
+        "files_per_sec": round(len(entries) / elapsed, 2) if elapsed else 0.0,
+        "p50_latency_s": round(percentile(latencies, 50), 3),
+        "p95_latency_s": round(percentile(latencies, 95), 3),
+        "failed": batch_size - len(entries),
+        "peak_memory_mb": round(peak_bytes / (1024 * 1024), 1),
+        "export_s": round(export_seconds, 3),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a fake Gemini model.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--audio-seconds", type=float, nargs="+", default=[30, 300])
+    parser.add_argument("--workers", type=int, default=pipeline.MAX_WORKERS)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls that fail with a 429")
+    parser.add_argument("--response-words", type=int, default=500)
+    parser.add_argument("--stream", action="store_true", help="Use the streaming request path")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    genai = pipeline.get_genai()
+    genai.GenerativeModel = make_fake_model(args.latency, args.jitter, args.error_rate, args.response_words)
+    genai.upload_file = fake_upload_file
+    # Retries against the fake should not wait for real backoff times
+    pipeline.get_scheduler().base_delay = 0.01
+
+    rows = []
+    for audio_seconds in args.audio_seconds:
+        for batch_size in args.batch_sizes:
+            rows.append(run_case(batch_size, audio_seconds, args.workers, args.stream))
+            print(json.dumps(rows[-1]))
+
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print()
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+    if args.json_path:
+        with open(os.path.join(_ORIGINAL_CWD, args.json_path), "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
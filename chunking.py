@@ -0,0 +1,119 @@
+import os
+import re
+import tempfile
+
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+from pydub.utils import mediainfo
+
+# Recordings longer than this are split before being sent to the model
+DEFAULT_CHUNK_THRESHOLD_MS = 10 * 60 * 1000
+DEFAULT_MAX_WINDOW_MS = 8 * 60 * 1000
+DEFAULT_MIN_WINDOW_MS = 2 * 60 * 1000
+DEFAULT_OVERLAP_MS = 5 * 1000
+# Longest run of words looked at when removing text repeated across a cut
+MAX_OVERLAP_WORDS = 60
+
+
+def probe_duration_ms(audio_path):
+    """Return the duration of the file in milliseconds using ffprobe, or None."""
+    try:
+        return int(float(mediainfo(audio_path)["duration"]) * 1000)
+    except (KeyError, ValueError, OSError):
+        return None
+
+
+def find_windows(audio, max_window_ms=DEFAULT_MAX_WINDOW_MS, min_window_ms=DEFAULT_MIN_WINDOW_MS,
+                 overlap_ms=DEFAULT_OVERLAP_MS, min_silence_len=700, silence_thresh=None):
+    """Split `audio` into (start_ms, end_ms) windows no longer than max_window_ms.
+
+    Cuts are placed in the middle of the last silence that falls inside each
+    window. When a window contains no usable silence it is cut hard at
+    max_window_ms and the next window starts `overlap_ms` earlier so no words
+    are lost at the boundary.
+    """
+    length = len(audio)
+    if length <= max_window_ms:
+        return [(0, length)]
+
+    if silence_thresh is None:
+        silence_thresh = audio.dBFS - 16
+    cut_points = [
+        (start + end) // 2
+        for start, end in detect_silence(audio, min_silence_len=min_silence_len, silence_thresh=silence_thresh)
+    ]
+
+    windows = []
+    start = 0
+    while start < length:
+        limit = start + max_window_ms
+        if limit >= length:
+            windows.append((start, length))
+            break
+
+        candidates = [c for c in cut_points if start + min_window_ms <= c <= limit]
+        if candidates:
+            end = candidates[-1]
+            windows.append((start, end))
+            start = end
+        else:
+            windows.append((start, limit))
+            start = limit - overlap_ms
+
+    return windows
+
+
+def export_windows(audio, windows, export_format="mp3", bitrate="64k"):
+    """Write each window to its own temp file and return the file paths."""
+    paths = []
+    for start, end in windows:
+        with tempfile.NamedTemporaryFile(suffix=f".{export_format}", delete=False) as tmp:
+            audio[start:end].export(tmp, format=export_format, bitrate=bitrate)
+            paths.append(tmp.name)
+    return paths
+
+
+def load_audio(audio_path):
+    """Decode an audio file with pydub."""
+    return AudioSegment.from_file(audio_path)
+
+
+def format_timestamp(ms):
+    seconds = ms // 1000
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def strip_overlap(previous_text, text, max_words=MAX_OVERLAP_WORDS, min_words=3):
+    """Remove the leading words of `text` that repeat the tail of `previous_text`."""
+    lowered_prev = [w.lower() for w in previous_text.split()[-max_words:]]
+    matches = list(re.finditer(r"\S+", text))[:max_words]
+    lowered = [m.group().lower() for m in matches]
+
+    for size in range(min(len(lowered_prev), len(lowered)), min_words - 1, -1):
+        if lowered_prev[-size:] == lowered[:size]:
+            return text[matches[size - 1].end():].lstrip()
+    return text
+
+
+def stitch_segments(texts, windows):
+    """Join segment outputs in order with timestamp headers and overlap removed."""
+    parts = []
+    previous = ""
+    previous_end = 0
+    for text, (start, end) in zip(texts, windows):
+        text = (text or "").strip()
+        if previous and text and start < previous_end:
+            text = strip_overlap(previous, text)
+        parts.append(f"[{format_timestamp(start)} - {format_timestamp(end)}]\n{text}")
+        if text:
+            previous = text
+        previous_end = end
+    return "\n\n".join(parts)
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
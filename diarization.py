@@ -0,0 +1,237 @@
+"""Speaker-diarized segments: the JSON schema requested from the model and a compact columnar store.
+
+A conversation comes back from the model as a list of {speaker, start, end,
+text} segments. It is rendered as "Speaker: [hh:mm:ss - hh:mm:ss] text" lines
+for the transcript column and kept as a SegmentTable. The table stores
+speaker ids, times and sentiment in NumPy arrays and all the text in one UTF-8
+buffer, so per-speaker stats and seeking to a time are array operations.
+"""
+import json
+import re
+import struct
+import zlib
+
+import numpy as np
+
+from chunking import format_timestamp, strip_overlap
+from sentiment import SPEAKER_RE, TIMESTAMP_RE as HEADER_RE, label_for, score_texts
+
+SEGMENT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "speaker": {"type": "string"},
+            "start": {"type": "number"},
+            "end": {"type": "number"},
+            "text": {"type": "string"},
+        },
+        "required": ["speaker", "start", "end", "text"],
+    },
+}
+SEGMENT_INSTRUCTIONS = (
+    "a list of speaker turns in order, each with a consistent speaker label (e.g. Speaker 1), "
+    "start and end times in seconds from the beginning of the audio, and the words spoken"
+)
+
+TIMES_RE = re.compile(r"^\[(\d{1,2}:\d{2}:\d{2})(?:\s*-\s*(\d{1,2}:\d{2}:\d{2}))?\]\s*")
+# Column order in the serialized table
+ARRAYS = (
+    ("speaker_ids", np.uint16), ("start_ms", np.int32), ("end_ms", np.int32),
+    ("text_offsets", np.uint32), ("polarity", np.float32), ("subjectivity", np.float32),
+)
+UNKNOWN_MS = -1
+
+
+def _to_ms(value):
+    try:
+        return max(0, int(round(float(value) * 1000)))
+    except (TypeError, ValueError):
+        return UNKNOWN_MS
+
+
+def _parse_timestamp(value):
+    hours, minutes, seconds = (int(part) for part in value.split(":"))
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000
+
+
+def normalize_segments(raw):
+    """Turn the model's segment list into dicts with speaker, start_ms, end_ms and text."""
+    segments = []
+    for item in raw or []:
+        if not isinstance(item, dict) or not str(item.get("text") or "").strip():
+            continue
+        segments.append({
+            "speaker": str(item.get("speaker") or "Speaker").strip(),
+            "start_ms": _to_ms(item.get("start")),
+            "end_ms": _to_ms(item.get("end")),
+            "text": str(item["text"]).strip(),
+        })
+    return segments
+
+
+def render_conversation(segments):
+    """Render segments as "Speaker: [hh:mm:ss - hh:mm:ss] text" lines."""
+    lines = []
+    for segment in segments:
+        times = ""
+        if segment["start_ms"] != UNKNOWN_MS:
+            end = f" - {format_timestamp(segment['end_ms'])}" if segment["end_ms"] != UNKNOWN_MS else ""
+            times = f"[{format_timestamp(segment['start_ms'])}{end}] "
+        lines.append(f"{segment['speaker']}: {times}{segment['text']}")
+    return "\n".join(lines)
+
+
+def parse_conversation(text):
+    """Recover segments from a rendered (or free-text) conversation transcript.
+
+    Lines without a speaker label continue the previous turn and the window
+    headers of split recordings are skipped; times are UNKNOWN_MS where the
+    line has none.
+    """
+    segments = []
+    for line in (text or "").splitlines():
+        if HEADER_RE.match(line):
+            continue
+        match = SPEAKER_RE.match(line)
+        if match:
+            body = match.group(2).strip()
+            times = TIMES_RE.match(body)
+            start_ms = end_ms = UNKNOWN_MS
+            if times:
+                start_ms = _parse_timestamp(times.group(1))
+                end_ms = _parse_timestamp(times.group(2)) if times.group(2) else UNKNOWN_MS
+                body = body[times.end():]
+            segments.append({"speaker": match.group(1).strip(), "start_ms": start_ms, "end_ms": end_ms,
+                             "text": body})
+        elif line.strip() and segments:
+            segments[-1]["text"] += " " + line.strip()
+    return segments
+
+
+def join_conversation(previous, text):
+    """Append a conversation transcript to `previous`, dropping the words both repeat where they overlap.
+
+    Speaker labels and times are left out of the comparison, since two
+    windows rarely label or time a shared turn identically. Falls back to
+    line-joined plain text when `text` has no speaker turns.
+    """
+    later = parse_conversation(text)
+    if not previous:
+        return text
+    if not later:
+        return f"{previous}\n{strip_overlap(previous, text)}".strip()
+    tail = " ".join(segment["text"] for segment in parse_conversation("\n".join(previous.splitlines()[-50:])))
+    words = " ".join(segment["text"] for segment in later)
+    drop = len(words.split()) - len(strip_overlap(tail, words).split())
+    for segment in later:
+        segment_words = segment["text"].split()
+        if drop < len(segment_words):
+            segment["text"] = " ".join(segment_words[drop:])
+            break
+        drop -= len(segment_words)
+        segment["text"] = ""
+    return "\n".join(part for part in (previous, render_conversation([s for s in later if s["text"]])) if part)
+
+
+class SegmentTable:
+    """Columnar speaker segments of one transcript with per-segment sentiment."""
+
+    def __init__(self, speakers, text, **arrays):
+        self.speakers = speakers
+        self.text = text
+        for name, dtype in ARRAYS:
+            setattr(self, name, np.asarray(arrays[name], dtype=dtype))
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build the table, scoring every segment's sentiment in one pass."""
+        speakers = list(dict.fromkeys(segment["speaker"] for segment in segments))
+        speaker_index = {speaker: i for i, speaker in enumerate(speakers)}
+        encoded = [segment["text"].encode("utf-8") for segment in segments]
+        scores = score_texts([segment["text"] for segment in segments])
+        return cls(
+            speakers,
+            b"".join(encoded),
+            speaker_ids=[speaker_index[segment["speaker"]] for segment in segments],
+            start_ms=[segment["start_ms"] for segment in segments],
+            end_ms=[segment["end_ms"] for segment in segments],
+            text_offsets=np.concatenate(([0], np.cumsum([len(chunk) for chunk in encoded]))),
+            polarity=[score[0] for score in scores],
+            subjectivity=[score[1] for score in scores],
+        )
+
+    def __len__(self):
+        return len(self.speaker_ids)
+
+    def segment_text(self, i):
+        return self.text[self.text_offsets[i]:self.text_offsets[i + 1]].decode("utf-8")
+
+    def segment(self, i):
+        return {
+            "segment": i + 1,
+            "speaker": self.speakers[self.speaker_ids[i]],
+            "start_ms": int(self.start_ms[i]),
+            "end_ms": int(self.end_ms[i]),
+            "text": self.segment_text(i),
+            "polarity": float(self.polarity[i]),
+            "subjectivity": float(self.subjectivity[i]),
+            "sentiment": label_for(self.polarity[i], self.subjectivity[i]),
+        }
+
+    def rows(self):
+        return [self.segment(i) for i in range(len(self))]
+
+    def at(self, ms):
+        """Index of the segment being spoken at `ms`, or None."""
+        known = np.flatnonzero(self.start_ms >= 0)
+        if not len(known):
+            return None
+        pos = np.searchsorted(self.start_ms[known], ms, side="right") - 1
+        return int(known[pos]) if pos >= 0 else None
+
+    def speaker_stats(self):
+        """Per-speaker turn count, talk time, word count and mean sentiment."""
+        count = len(self.speakers)
+        turns = np.bincount(self.speaker_ids, minlength=count)
+        timed = (self.start_ms >= 0) & (self.end_ms >= self.start_ms)
+        talk_ms = np.bincount(self.speaker_ids, weights=np.where(timed, self.end_ms - self.start_ms, 0),
+                              minlength=count)
+        words = np.bincount(
+            self.speaker_ids, weights=[len(self.segment_text(i).split()) for i in range(len(self))], minlength=count
+        )
+        polarity = np.bincount(self.speaker_ids, weights=self.polarity, minlength=count) / np.maximum(turns, 1)
+        subjectivity = np.bincount(self.speaker_ids, weights=self.subjectivity, minlength=count) / np.maximum(turns, 1)
+        return [
+            {
+                "speaker": speaker,
+                "segments": int(turns[i]),
+                "talk_seconds": round(float(talk_ms[i]) / 1000, 1),
+                "words": int(words[i]),
+                "polarity": float(polarity[i]),
+                "subjectivity": float(subjectivity[i]),
+                "sentiment": label_for(polarity[i], subjectivity[i]),
+            }
+            for i, speaker in enumerate(self.speakers)
+        ]
+
+    def to_bytes(self):
+        """Serialize as zlib(header length, JSON header, arrays, text)."""
+        header = json.dumps({"speakers": self.speakers, "count": len(self)}).encode("utf-8")
+        parts = [struct.pack("<I", len(header)), header]
+        parts += [getattr(self, name).astype(dtype).tobytes() for name, dtype in ARRAYS]
+        parts.append(self.text)
+        return zlib.compress(b"".join(parts))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = zlib.decompress(data)
+        header_length = struct.unpack_from("<I", data)[0]
+        header = json.loads(data[4:4 + header_length])
+        offset = 4 + header_length
+        arrays = {}
+        for name, dtype in ARRAYS:
+            length = header["count"] + 1 if name == "text_offsets" else header["count"]
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=length, offset=offset)
+            offset += length * np.dtype(dtype).itemsize
+        return cls(header["speakers"], data[offset:], **arrays)
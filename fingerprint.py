@@ -0,0 +1,200 @@
+"""Spectral-peak fingerprints for spotting re-encoded, trimmed or re-uploaded recordings.
+
+Audio is decoded to 8 kHz mono and the loudest bin of a few frequency bands
+is kept wherever it is a local maximum in time. Pairs of nearby peaks are
+hashed as (anchor bin, target bin, time gap). These hashes survive
+re-encoding and bitrate changes. Two recordings match when many of their
+hashes agree at the same time offset. The index is a small SQLite database
+of hashes per recording, plus the result rows saved for that recording.
+"""
+import json
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+from pydub import AudioSegment
+
+DEFAULT_DB_PATH = "fingerprints.db"
+
+SAMPLE_RATE = 8000
+FRAME_SIZE = 512
+HOP_SIZE = 256
+FRAME_MS = HOP_SIZE * 1000 / SAMPLE_RATE
+# FFT bin edges of the bands searched for peaks, roughly log-spaced from 150 Hz to 4 kHz
+BAND_EDGES = (10, 20, 40, 64, 96, 160, 257)
+# A band peak must be the loudest within this many frames either side (about 0.3 s)
+PEAK_WINDOW = 10
+# Each anchor peak is paired with this many peaks that follow it
+FAN_OUT = 3
+MAX_GAP_FRAMES = 63
+BLOCK_FRAMES = 4096
+
+# Aligned hashes needed before two recordings count as the same audio
+MIN_ALIGNED = 20
+# Share of the query's hashes in the matched stretch that must align
+MIN_DENSITY = 0.05
+# A recording covering this much of another is treated as containing it
+MIN_COVERAGE = 0.9
+
+
+def load_samples(audio_path):
+    """Decode a file to 8 kHz mono float samples."""
+    audio = AudioSegment.from_file(audio_path, parameters=["-ac", "1", "-ar", str(SAMPLE_RATE)])
+    audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def band_peaks(samples):
+    """Return (frames, bands) arrays of each band's loudest bin and its log magnitude per frame."""
+    count = max(0, (len(samples) - FRAME_SIZE) // HOP_SIZE + 1)
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    bins = np.empty((count, len(BAND_EDGES) - 1), dtype=np.int16)
+    levels = np.empty((count, len(BAND_EDGES) - 1), dtype=np.float32)
+    # Spectrogram blocks are reduced to band maxima straight away, so memory stays flat
+    for start in range(0, count, BLOCK_FRAMES):
+        stop = min(count, start + BLOCK_FRAMES)
+        index = (np.arange(start, stop)[:, None] * HOP_SIZE) + np.arange(FRAME_SIZE)
+        spectrum = np.log1p(np.abs(np.fft.rfft(samples[index] * window, axis=1)))
+        for band, (low, high) in enumerate(zip(BAND_EDGES, BAND_EDGES[1:])):
+            best = np.argmax(spectrum[:, low:high], axis=1)
+            bins[start:stop, band] = best + low
+            levels[start:stop, band] = spectrum[np.arange(stop - start), best + low]
+    return bins, levels
+
+
+def spectral_peaks(samples):
+    """Return (frame, bin) arrays of the peaks, ordered by time."""
+    bins, levels = band_peaks(samples)
+    if not len(levels):
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    padded = np.pad(levels, ((PEAK_WINDOW, PEAK_WINDOW), (0, 0)), constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * PEAK_WINDOW + 1, axis=0).max(axis=-1)
+    # Ignore the quiet half of each band so silence and hiss do not produce peaks
+    keep = (levels >= local_max) & (levels > np.median(levels, axis=0))
+    frames, bands = np.nonzero(keep)
+    return frames.astype(np.int32), bins[frames, bands].astype(np.int32)
+
+
+def fingerprint(samples):
+    """Hash pairs of nearby peaks; returns {"hashes", "times", "duration_ms"}."""
+    frames, bins = spectral_peaks(samples)
+    hashes, times = [], []
+    for step in range(1, FAN_OUT + 1):
+        gaps = frames[step:] - frames[:-step]
+        ok = (gaps > 0) & (gaps <= MAX_GAP_FRAMES)
+        hashes.append((bins[:-step][ok] << 15) | (bins[step:][ok] << 6) | gaps[ok])
+        times.append(frames[:-step][ok])
+    return {
+        "hashes": np.concatenate(hashes).astype(np.int64) if hashes else np.empty(0, dtype=np.int64),
+        "times": np.concatenate(times).astype(np.int32) if times else np.empty(0, dtype=np.int32),
+        "duration_ms": int(len(samples) * 1000 / SAMPLE_RATE),
+    }
+
+
+def fingerprint_file(audio_path):
+    return fingerprint(load_samples(audio_path))
+
+
+def shift_map(match):
+    """Offset map (see vad.to_original_ms) moving the matched recording's timestamps onto the query's timeline."""
+    offset = match["offset_ms"]
+    return [(max(offset, 0), max(-offset, 0), max(match["duration_ms"], match["query_duration_ms"]))]
+
+
+class FingerprintIndex:
+    """Fingerprints of processed recordings and the result rows saved for each."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS recordings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    duration_ms INTEGER NOT NULL,
+                    hash_count INTEGER NOT NULL,
+                    outputs TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS hashes (hash INTEGER NOT NULL, recording_id INTEGER NOT NULL, "
+                         "time INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (hash)")
+            conn.commit()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def add(self, name, fp, outputs):
+        """Index a recording; `outputs` is a list of (option, format_type, result_id)."""
+        with closing(self._connect()) as conn:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO recordings (name, duration_ms, hash_count, outputs, created) VALUES (?, ?, ?, ?, ?)",
+                    (name, fp["duration_ms"], len(fp["hashes"]), json.dumps([list(o) for o in outputs]), time.time())
+                )
+                recording_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO hashes (hash, recording_id, time) VALUES (?, ?, ?)",
+                    zip(fp["hashes"].tolist(), [recording_id] * len(fp["hashes"]), fp["times"].tolist())
+                )
+        return recording_id
+
+    def match(self, fp, limit=3):
+        """Indexed recordings sharing audio with `fp`, best first.
+
+        Each match has the recording's id, name, duration and outputs, the
+        offset (its time minus the query's), the matched stretch in both
+        recordings and how much of each it covers.
+        """
+        if not len(fp["hashes"]):
+            return []
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE query (hash INTEGER, time INTEGER)")
+            conn.executemany("INSERT INTO query VALUES (?, ?)", zip(fp["hashes"].tolist(), fp["times"].tolist()))
+            pairs = np.array(conn.execute(
+                "SELECT h.recording_id, h.time - q.time, q.time FROM query q JOIN hashes h ON h.hash = q.hash"
+            ).fetchall(), dtype=np.int64).reshape(-1, 3)
+            recordings = {
+                row[0]: row[1:] for row in conn.execute("SELECT id, name, duration_ms, outputs FROM recordings")
+            }
+        if not len(pairs):
+            return []
+
+        # Votes per (recording, offset); neighbouring offsets absorb frame jitter between encodings
+        keys, counts = np.unique(pairs[:, :2], axis=0, return_counts=True)
+        matches = []
+        for recording_id in np.unique(keys[:, 0]):
+            rows = keys[:, 0] == recording_id
+            offsets, votes = keys[rows, 1], counts[rows]
+            best = offsets[np.argmax(votes)]
+            aligned = pairs[(pairs[:, 0] == recording_id) & (np.abs(pairs[:, 1] - best) <= 1)]
+            if len(aligned) < MIN_ALIGNED:
+                continue
+            start, end = int(aligned[:, 2].min()), int(aligned[:, 2].max()) + 1
+            in_stretch = np.count_nonzero((fp["times"] >= start) & (fp["times"] < end))
+            if len(aligned) < MIN_DENSITY * in_stretch:
+                continue
+            name, duration_ms, outputs = recordings[int(recording_id)]
+            span_ms = (end - start) * FRAME_MS
+            matches.append({
+                "recording_id": int(recording_id),
+                "name": name,
+                "duration_ms": duration_ms,
+                "query_duration_ms": fp["duration_ms"],
+                "outputs": [tuple(o) for o in json.loads(outputs)],
+                "offset_ms": int(best * FRAME_MS),
+                "query_start_ms": int(start * FRAME_MS),
+                "query_end_ms": int(end * FRAME_MS),
+                "aligned": len(aligned),
+                "query_coverage": min(1.0, span_ms / max(fp["duration_ms"], 1)),
+                "reference_coverage": min(1.0, span_ms / max(duration_ms, 1)),
+            })
+        matches.sort(key=lambda m: m["aligned"], reverse=True)
+        return matches[:limit]
@@ -0,0 +1,265 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+DEFAULT_DB_PATH = "jobs.db"
+DEFAULT_JOBS_DIR = os.path.join(".cache", "jobs")
+# Partial streamed text is written to the database at most this often per file
+PARTIAL_FLUSH_SECONDS = 1.0
+# A running file's owner refreshes its heartbeat this often; another process only takes
+# the file over once the heartbeat is older than LEASE_SECONDS
+HEARTBEAT_SECONDS = 10.0
+LEASE_SECONDS = 60.0
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by one bounded worker pool.
+
+    A job is a list of uploaded files plus the settings chosen for them. Files
+    are copied into `jobs_dir` and every file gets a status row, so work keeps
+    going when the Streamlit script reruns or the browser disconnects, and
+    files left queued or running by a server restart are picked up again.
+    Several processes may share one database: a running file belongs to the
+    queue that claimed it for as long as that queue keeps its heartbeat fresh,
+    and only files whose heartbeat has gone stale are requeued.
+    `handler(name, audio_path, settings, on_chunk)` does the actual work and
+    returns a JSON-serialisable result.
+    """
+
+    def __init__(self, handler, db_path=DEFAULT_DB_PATH, jobs_dir=DEFAULT_JOBS_DIR, max_workers=4):
+        self.handler = handler
+        self.db_path = db_path
+        self.jobs_dir = jobs_dir
+        self.worker_id = uuid.uuid4().hex
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        os.makedirs(jobs_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    settings TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    audio_path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    partial_text TEXT,
+                    result TEXT,
+                    error TEXT,
+                    finished_at REAL,
+                    worker_id TEXT,
+                    heartbeat REAL,
+                    PRIMARY KEY (job_id, idx)
+                );
+                """
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(job_files)")]
+            for column, kind in (("worker_id", "TEXT"), ("heartbeat", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE job_files ADD COLUMN {column} {kind}")
+            conn.commit()
+
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+        self.resume()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self._execute(
+                    "UPDATE job_files SET heartbeat = ? WHERE worker_id = ? AND status = 'running'",
+                    (time.time(), self.worker_id),
+                )
+            except sqlite3.Error:
+                # A busy database only delays this beat; the lease allows for several
+                pass
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql, params=()):
+        """Run one statement in its own transaction; returns the number of rows it changed."""
+        with closing(self._connect()) as conn:
+            with conn:
+                return conn.execute(sql, params).rowcount
+
+    def submit(self, uploads, settings):
+        """Queue (name, file object) pairs for processing and return the job ID."""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        rows = []
+        for idx, (name, fileobj) in enumerate(uploads):
+            suffix = os.path.splitext(name)[1] or ".wav"
+            audio_path = os.path.join(job_dir, f"{idx}{suffix}")
+            with open(audio_path, "wb") as out:
+                _write_upload(fileobj, out)
+            rows.append((job_id, idx, name, audio_path))
+
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, created_at, settings) VALUES (?, ?, ?)",
+                    (job_id, time.time(), json.dumps(settings)),
+                )
+                conn.executemany(
+                    "INSERT INTO job_files (job_id, idx, name, audio_path) VALUES (?, ?, ?, ?)", rows
+                )
+
+        for _, idx, _, _ in rows:
+            self._executor.submit(self._run, job_id, idx)
+        return job_id
+
+    def resume(self):
+        """Requeue files whose owner stopped while running them and pick up every queued file.
+
+        A running file is only taken over once its heartbeat is older than
+        LEASE_SECONDS, so files another live process is working on are left
+        alone. Audio left behind by files that had already finished is deleted.
+        """
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    "UPDATE job_files SET status = 'queued', worker_id = NULL "
+                    "WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?)",
+                    (time.time() - LEASE_SECONDS,),
+                )
+            pending = conn.execute(
+                "SELECT job_id, idx FROM job_files WHERE status = 'queued' ORDER BY rowid"
+            ).fetchall()
+            finished = conn.execute(
+                "SELECT audio_path FROM job_files WHERE status IN ('done', 'failed')"
+            ).fetchall()
+        for row in finished:
+            _remove_audio(row["audio_path"])
+        for row in pending:
+            self._executor.submit(self._run, row["job_id"], row["idx"])
+
+    def _run(self, job_id, idx):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT f.name, f.audio_path, f.status, j.settings FROM job_files f "
+                "JOIN jobs j ON j.id = f.job_id WHERE f.job_id = ? AND f.idx = ?",
+                (job_id, idx),
+            ).fetchone()
+            if row is None or row["status"] != "queued":
+                return
+            # Another worker or process may claim the same file between the read and here
+            with conn:
+                claimed = conn.execute(
+                    "UPDATE job_files SET status = 'running', worker_id = ?, heartbeat = ? "
+                    "WHERE job_id = ? AND idx = ? AND status = 'queued'",
+                    (self.worker_id, time.time(), job_id, idx),
+                ).rowcount
+            if not claimed:
+                return
+
+        last_flush = [0.0]
+
+        def on_chunk(text):
+            now = time.monotonic()
+            if now - last_flush[0] >= PARTIAL_FLUSH_SECONDS:
+                last_flush[0] = now
+                self._execute(
+                    "UPDATE job_files SET partial_text = ? WHERE job_id = ? AND idx = ?", (text, job_id, idx)
+                )
+
+        # Only the owner finishes a file; if its lease lapsed and another process took the
+        # file over, that process now owns the row and the audio
+        owned = 0
+        try:
+            result = self.handler(row["name"], row["audio_path"], json.loads(row["settings"]), on_chunk)
+        except Exception as e:
+            owned = self._execute(
+                "UPDATE job_files SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE job_id = ? AND idx = ? AND worker_id = ?",
+                (str(e), time.time(), job_id, idx, self.worker_id),
+            )
+        else:
+            owned = self._execute(
+                "UPDATE job_files SET status = 'done', result = ?, partial_text = NULL, finished_at = ? "
+                "WHERE job_id = ? AND idx = ? AND worker_id = ?",
+                (json.dumps(result), time.time(), job_id, idx, self.worker_id),
+            )
+        finally:
+            if owned:
+                _remove_audio(row["audio_path"])
+
+    def status(self, job_id):
+        """Return counts of the job's files by status, or None for an unknown job."""
+        with closing(self._connect()) as conn:
+            job = conn.execute("SELECT created_at, settings FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM job_files WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+
+        total = sum(counts.values())
+        finished = counts.get("done", 0) + counts.get("failed", 0)
+        return {
+            "id": job_id,
+            "created_at": job["created_at"],
+            "settings": json.loads(job["settings"]),
+            "total": total,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "finished": finished == total,
+        }
+
+    def files(self, job_id):
+        """Return the job's file rows in upload order with results decoded."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT idx, name, status, partial_text, result, error FROM job_files "
+                "WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        return [
+            {
+                "idx": row["idx"],
+                "name": row["name"],
+                "status": row["status"],
+                "partial_text": row["partial_text"],
+                "result": json.loads(row["result"]) if row["result"] else None,
+                "error": row["error"],
+            }
+            for row in rows
+        ]
+
+
+def _write_upload(fileobj, out):
+    """Write an upload to disk without making another in-memory copy of it."""
+    if hasattr(fileobj, "getbuffer"):
+        # Streamlit's UploadedFile is a BytesIO; write its buffer directly
+        with fileobj.getbuffer() as view:
+            out.write(view)
+    else:
+        shutil.copyfileobj(fileobj, out)
+
+
+def _remove_audio(audio_path):
+    """Delete a job's audio file, and the job directory once it is empty."""
+    for remove, path in ((os.remove, audio_path), (os.rmdir, os.path.dirname(audio_path))):
+        try:
+            remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,132 @@
+"""Rolling-window transcription of audio that arrives in pieces, e.g. from a microphone.
+
+Captured audio is appended to a buffer and cut into fixed windows that
+overlap by a few seconds. Each window is sent as soon as it is complete, and
+the transcript is the windows' text joined in order with the words repeated
+across each overlap removed.
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pydub import AudioSegment
+
+from chunking import strip_overlap
+
+DEFAULT_WINDOW_MS = 30 * 1000
+DEFAULT_OVERLAP_MS = 3 * 1000
+# Windows are sent as 16 kHz mono WAV, small enough to go inline
+LIVE_SAMPLE_RATE = 16000
+
+
+def join_text(previous, text):
+    """Append a window's text to the transcript so far, dropping the words repeated across the overlap."""
+    if not previous:
+        return text
+    return f"{previous} {strip_overlap(previous, text)}".strip()
+
+
+class LiveSession:
+    """Collects audio, sends each closed window to `transcribe(path, (start_ms, end_ms))` and joins the results.
+
+    `feed` and `finish` are called from the UI thread; windows are transcribed
+    on the session's own pool, so a long backlog (for example a whole
+    recording delivered at once) is worked through in parallel. `join(previous,
+    text)` appends one window's text to the transcript so far.
+    """
+
+    def __init__(self, transcribe, window_ms=DEFAULT_WINDOW_MS, overlap_ms=DEFAULT_OVERLAP_MS, max_workers=4,
+                 join=join_text):
+        self.transcribe = transcribe
+        self.join = join
+        self.window_ms = window_ms
+        self.step_ms = window_ms - overlap_ms
+        self.finished = False
+        # Audio from buffer_start_ms onwards; earlier audio is no longer needed
+        self._buffer = AudioSegment.empty()
+        self._buffer_start_ms = 0
+        self._captured_ms = 0
+        self._next_start_ms = 0
+        self._results = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="live-window")
+
+    @property
+    def captured_ms(self):
+        return self._captured_ms
+
+    def feed(self, audio):
+        """Append newly captured audio and send every window it completes."""
+        if self.finished:
+            raise RuntimeError("The live session has already finished")
+        audio = audio.set_channels(1).set_frame_rate(LIVE_SAMPLE_RATE).set_sample_width(2)
+        self._buffer += audio
+        self._captured_ms = self._buffer_start_ms + len(self._buffer)
+        while self._next_start_ms + self.window_ms <= self.captured_ms:
+            self._send(self._next_start_ms, self._next_start_ms + self.window_ms)
+            self._next_start_ms += self.step_ms
+        self._trim()
+
+    def finish(self):
+        """Send whatever audio is left after the last full window and stop accepting audio."""
+        if self.finished:
+            return
+        self.finished = True
+        if self.captured_ms > self._next_start_ms + (self.window_ms - self.step_ms):
+            self._send(self._next_start_ms, self.captured_ms)
+        self._buffer = AudioSegment.empty()
+        self._executor.shutdown(wait=False)
+
+    def _trim(self):
+        drop = self._next_start_ms - self._buffer_start_ms
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start_ms = self._next_start_ms
+
+    def _send(self, start_ms, end_ms):
+        window = self._buffer[start_ms - self._buffer_start_ms:end_ms - self._buffer_start_ms]
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+            window.export(tmp, format="wav")
+        slot = {"start_ms": start_ms, "end_ms": end_ms, "text": None, "error": None}
+        with self._lock:
+            self._results.append(slot)
+        self._executor.submit(self._run, tmp.name, slot)
+
+    def _run(self, path, slot):
+        text = ""
+        try:
+            text = self.transcribe(path, (slot["start_ms"], slot["end_ms"]))
+        except Exception as e:
+            slot["error"] = str(e)
+        finally:
+            os.remove(path)
+        with self._lock:
+            slot["text"] = text
+
+    def status(self):
+        """Return counts of windows sent, done and failed, and the captured length."""
+        with self._lock:
+            done = sum(slot["text"] is not None for slot in self._results)
+            failed = sum(slot["error"] is not None for slot in self._results)
+            sent = len(self._results)
+        return {"sent": sent, "done": done, "failed": failed, "captured_ms": self.captured_ms,
+                "finished": self.finished}
+
+    def text(self):
+        """Transcript of the windows finished so far, stopping at the first one still running."""
+        with self._lock:
+            texts = []
+            for slot in self._results:
+                if slot["text"] is None:
+                    break
+                texts.append(slot["text"].strip())
+        joined = ""
+        for text in texts:
+            if text:
+                joined = self.join(joined, text)
+        return joined
+
+    def errors(self):
+        with self._lock:
+            return [slot["error"] for slot in self._results if slot["error"]]
@@ -0,0 +1,166 @@
+import bisect
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_collector = contextvars.ContextVar("metrics_collector", default=None)
+
+
+class StageStats:
+    """Duration histogram plus byte and token totals for one pipeline stage."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.tokens = 0
+
+    def observe(self, seconds, nbytes, tokens):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += nbytes
+        self.tokens += tokens
+
+
+class Metrics:
+    """Thread-safe registry of per-stage timings."""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, nbytes=0, tokens=0):
+        with self._lock:
+            self._stages.setdefault(stage, StageStats()).observe(seconds, nbytes, tokens)
+        collector = _collector.get()
+        if collector is not None:
+            collector.append({"stage": stage, "seconds": seconds, "bytes": nbytes, "tokens": tokens})
+
+    @contextmanager
+    def span(self, stage, nbytes=0, tokens=0):
+        """Time the block as `stage`. The yielded dict may set "bytes" and "tokens"."""
+        info = {"bytes": nbytes, "tokens": tokens}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.observe(stage, time.perf_counter() - start, info["bytes"] or 0, info["tokens"] or 0)
+
+    def snapshot(self):
+        """Return the current stats as plain dicts keyed by stage."""
+        with self._lock:
+            return {
+                stage: {
+                    "count": stats.count,
+                    "seconds_total": round(stats.seconds, 6),
+                    "bytes_total": stats.bytes,
+                    "tokens_total": stats.tokens,
+                    "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], _cumulative(stats.bucket_counts))),
+                }
+                for stage, stats in sorted(self._stages.items())
+            }
+
+    def to_prometheus(self):
+        """Render the stats in the Prometheus text exposition format."""
+        lines = [
+            "# HELP transcribe_stage_seconds Time spent in each pipeline stage.",
+            "# TYPE transcribe_stage_seconds histogram",
+        ]
+        snapshot = self.snapshot()
+        for stage, stats in snapshot.items():
+            for bound, count in stats["buckets"].items():
+                lines.append(f'transcribe_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'transcribe_stage_seconds_sum{{stage="{stage}"}} {stats["seconds_total"]}')
+            lines.append(f'transcribe_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        for name, key in (("bytes", "bytes_total"), ("tokens", "tokens_total")):
+            lines.append(f"# TYPE transcribe_stage_{name}_total counter")
+            for stage, stats in snapshot.items():
+                lines.append(f'transcribe_stage_{name}_total{{stage="{stage}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write_files(self, prometheus_path=None, json_path=None):
+        """Write the current stats to a Prometheus text file and/or a JSON file."""
+        for path, render in ((prometheus_path, self.to_prometheus),
+                             (json_path, lambda: json.dumps(self.snapshot(), indent=2))):
+            if path:
+                # A temp file of its own, since several workers may write at once
+                fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp",
+                                                dir=os.path.dirname(os.path.abspath(path)))
+                try:
+                    with open(fd, "w", encoding="utf-8") as f:
+                        f.write(render())
+                    # Replace in one step so scrapers never see a half-written file
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+
+
+def _cumulative(counts):
+    total = 0
+    result = []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+@contextmanager
+def collect():
+    """Collect the spans recorded in this context (and copied contexts) into a list."""
+    records = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def summarize(records):
+    """Aggregate span records into per-stage rows for a timing table."""
+    rows = {}
+    for record in records:
+        row = rows.setdefault(record["stage"], {"stage": record["stage"], "count": 0, "seconds": 0.0,
+                                                "bytes": 0, "tokens": 0})
+        row["count"] += 1
+        row["seconds"] += record["seconds"]
+        row["bytes"] += record["bytes"]
+        row["tokens"] += record["tokens"]
+    return sorted(rows.values(), key=lambda row: -row["seconds"])
+
+
+def start_http_server(metrics, port, host="0.0.0.0"):
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,820 @@
+"""Transcription pipeline shared by the Streamlit app and the command-line runner.
+
+Nothing in this module imports Streamlit.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from batch import run_batch, DEFAULT_MAX_WORKERS
+from result_cache import ResultCache, cache_key, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DEFAULT_MAX_AGE
+from transport import build_audio_part, get_genai, read_for_request, DEFAULT_INLINE_LIMIT_BYTES
+from transcode import DEFAULT_BITRATE, detect_mime_type, transcode_for_speech
+from scheduler import (
+    RequestScheduler, estimate_audio_tokens, DEFAULT_RPM, DEFAULT_TPM, DEFAULT_MAX_RETRIES, fallback_errors
+)
+from routing import ModelRouter, load_routing, DEFAULT_MODEL, DEFAULT_QUALITY, QUALITY_LEVELS
+from vad import trim_non_speech, reproject_timestamps
+from live import LiveSession, join_text
+from fingerprint import (
+    FingerprintIndex, fingerprint_file, shift_map, MIN_COVERAGE, DEFAULT_DB_PATH as DEFAULT_FINGERPRINT_DB
+)
+from metrics import Metrics, collect, summarize, start_http_server
+from job_queue import JobQueue, DEFAULT_DB_PATH as DEFAULT_JOBS_DB, DEFAULT_JOBS_DIR
+from results_store import ResultsStore, day_key, DEFAULT_DB_PATH
+from sentiment import label_for, score_texts
+from diarization import (
+    SEGMENT_INSTRUCTIONS, SEGMENT_SCHEMA, join_conversation, normalize_segments, parse_conversation,
+    render_conversation
+)
+from preflight import MAX_REQUEST_AUDIO_MS, probe_audio, estimate_file, model_speed, predict_wall_clock
+from chunking import (
+    DEFAULT_CHUNK_THRESHOLD_MS, DEFAULT_MAX_WINDOW_MS, probe_duration_ms, load_audio, find_windows,
+    export_windows, stitch_segments, remove_files
+)
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables; the Gemini SDK itself is imported on first use
+load_dotenv()
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", DEFAULT_MAX_WORKERS))
+# Files processed at once across all sessions' queued jobs
+QUEUE_WORKERS = int(os.environ.get("QUEUE_WORKERS", MAX_WORKERS))
+MODEL_NAME = DEFAULT_MODEL
+# Fast, Balanced or Best; shifts the routing table towards faster or stronger models
+MODEL_QUALITY = os.environ.get("MODEL_QUALITY", DEFAULT_QUALITY)
+# Retries on one model before the request moves to the next model in its route
+FALLBACK_RETRIES = int(os.environ.get("FALLBACK_RETRIES", 1))
+INLINE_LIMIT_BYTES = int(os.environ.get("INLINE_LIMIT_BYTES", DEFAULT_INLINE_LIMIT_BYTES))
+CHUNK_THRESHOLD_MS = int(os.environ.get("CHUNK_THRESHOLD_MS", DEFAULT_CHUNK_THRESHOLD_MS))
+METRICS_FILE = os.environ.get("METRICS_FILE", os.path.join(".cache", "metrics.prom"))
+# Uncovered audio shorter than this is not sent when most of a file was already transcribed
+MIN_NEW_AUDIO_MS = int(os.environ.get("MIN_NEW_AUDIO_MS", 10 * 1000))
+METRICS_JSON_FILE = os.environ.get("METRICS_JSON_FILE", os.path.join(".cache", "metrics.json"))
+
+SPEAKER_FORMAT = "Conversation style (identify speakers)"
+FORMAT_OPTIONS = [
+    SPEAKER_FORMAT,
+    "Paragraph",
+    "Bullet points",
+    "Summary"
+]
+TASK_OPTIONS = ["Transcribe", "Translate"]
+# Transcript formats that keep every word, so other outputs can be derived from them as text
+SOURCE_FORMATS = [SPEAKER_FORMAT, "Paragraph"]
+NO_OUTPUT = "No output generated."
+AUDIO_EXTENSIONS = ["wav", "mp3", "flac", "ogg", "m4a"]
+
+# ---------------------------- Shared Resources ---------------------------- #
+
+@lru_cache(maxsize=None)
+def get_result_cache():
+    """Process-wide result cache shared by all sessions and reruns."""
+    return ResultCache(
+        cache_dir=os.environ.get("RESULT_CACHE_DIR", DEFAULT_CACHE_DIR),
+        max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        max_age=int(os.environ.get("RESULT_CACHE_MAX_AGE", DEFAULT_MAX_AGE)),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_results_store():
+    """Process-wide results store; imports legacy daily workbooks on first use.
+
+    A Results_of_<day>.xlsx is imported (and so made searchable) only when the
+    store has nothing for that day yet.
+    """
+    store = ResultsStore(os.environ.get("RESULTS_DB", DEFAULT_DB_PATH))
+    for legacy_excel in sorted(glob.glob("Results_of_*.xlsx")):
+        try:
+            when = datetime.strptime(legacy_excel[len("Results_of_"):-len(".xlsx")], "%m_%d_%y")
+        except ValueError:
+            continue
+        if store.count(day_key(when)) == 0:
+            import pandas as pd
+
+            store.append(pd.read_excel(legacy_excel).fillna("").to_dict("records"), when)
+    return store
+
+
+@lru_cache(maxsize=None)
+def get_fingerprint_index():
+    """Process-wide index of recordings already transcribed, for near-duplicate detection."""
+    return FingerprintIndex(os.environ.get("FINGERPRINT_DB", DEFAULT_FINGERPRINT_DB))
+
+
+@lru_cache(maxsize=None)
+def get_scheduler():
+    """Process-wide request scheduler so every worker shares the same quota."""
+    return RequestScheduler(
+        rpm=int(os.environ.get("GEMINI_RPM", DEFAULT_RPM)),
+        tpm=int(os.environ.get("GEMINI_TPM", DEFAULT_TPM)),
+        max_retries=int(os.environ.get("GEMINI_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_router():
+    """Process-wide model router; MODEL_ROUTES may name a JSON file with the routing table."""
+    return ModelRouter(*load_routing(os.environ.get("MODEL_ROUTES")))
+
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    """Process-wide stage timings; served over HTTP when METRICS_PORT is set."""
+    metrics = Metrics()
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        start_http_server(metrics, int(port))
+    return metrics
+
+
+@lru_cache(maxsize=32)
+def _cached_model(model_name, config_json):
+    config = json.loads(config_json) if config_json else None
+    return get_genai().GenerativeModel(model_name, generation_config=config)
+
+
+def get_model(model_name=MODEL_NAME, generation_config=None):
+    """Process-wide GenerativeModel for each model name and generation config."""
+    return _cached_model(model_name, json.dumps(generation_config, sort_keys=True) if generation_config else None)
+
+
+@lru_cache(maxsize=None)
+def get_job_queue():
+    """Process-wide job queue; every session's jobs share its worker pool."""
+    return JobQueue(
+        run_queued_file,
+        db_path=os.environ.get("JOBS_DB", DEFAULT_JOBS_DB),
+        jobs_dir=os.environ.get("JOBS_DIR", DEFAULT_JOBS_DIR),
+        max_workers=QUEUE_WORKERS,
+    )
+
+# ---------------------------- Utility Functions ---------------------------- #
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def write_metrics():
+    """Write the current stage metrics to METRICS_FILE and METRICS_JSON_FILE.
+
+    Failures are logged, never raised: metrics must not fail the file they describe.
+    """
+    try:
+        for path in (METRICS_FILE, METRICS_JSON_FILE):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        get_metrics().write_files(METRICS_FILE, METRICS_JSON_FILE)
+    except Exception:
+        logger.exception("Could not write metrics files")
+
+
+def analyze_sentiment(text):
+    """Analyze sentiment using the TextBlob lexicon."""
+    with get_metrics().span("sentiment", nbytes=len(text)):
+        return label_for(*score_texts([text])[0])
+
+
+def save_results(data):
+    """Append results to the results store and to today's text and ZIP exports.
+
+    Only the new rows are written, so the exports stay downloadable and
+    current while a batch is still running. Returns the new row ids.
+    """
+    with get_metrics().span("save_results"):
+        ids = get_results_store().append(data)
+    save_results_to_text()
+    save_results_to_zip()
+    return ids
+
+
+def speaker_segments(result_id):
+    """Columnar speaker segments of a saved conversation-style result, or None."""
+    return get_results_store().segments(result_id)
+
+
+def search_results(query, limit=50, days=None, formats=None, sentiments=None):
+    """Ranked transcript segments matching `query` across all saved results."""
+    with get_metrics().span("search"):
+        return get_results_store().search(query, limit, days, formats, sentiments)
+
+
+def save_results_to_excel(day=None):
+    """Export the day's results from the store to an Excel file."""
+    results_filename = f"Results_of_{day or day_key()}.xlsx"
+    with get_metrics().span("export_excel") as span:
+        get_results_store().export_excel(results_filename, day)
+        span["bytes"] = os.path.getsize(results_filename)
+    return results_filename
+
+
+def save_results_to_text(day=None):
+    """Bring the day's text file up to date with the store."""
+    results_filename = f"Results_of_{day or day_key()}.txt"
+    with get_metrics().span("export_text") as span:
+        get_results_store().export_text(results_filename, day)
+        span["bytes"] = os.path.getsize(results_filename)
+    return results_filename
+
+
+def save_results_to_zip(day=None):
+    """Bring the day's ZIP of per-file TXT results up to date with the store."""
+    results_filename = f"Results_of_{day or day_key()}.zip"
+    with get_metrics().span("export_zip") as span:
+        get_results_store().export_zip(results_filename, day)
+        span["bytes"] = os.path.getsize(results_filename)
+    return results_filename
+
+
+def build_prompt(format_type, option):
+    """Prompt sent with the audio for the chosen task and format."""
+    if option == "Transcribe":
+        return f"Act as a speech recognition expert. Provide a complete transcript in {format_type} format."
+    return f"Translate the following audio to English in {format_type} format."
+
+
+@lru_cache(maxsize=64)
+def count_prompt_tokens(prompt):
+    """Token count of a prompt from the API, falling back to 4 characters per token."""
+    try:
+        return get_model().count_tokens(prompt).total_tokens
+    except Exception:
+        return len(prompt) // 4 + 1
+
+
+def preflight(files, outputs, split_long=True, max_workers=MAX_WORKERS, file_workers=QUEUE_WORKERS):
+    """Estimate duration, tokens and wall-clock time for a batch before anything is sent.
+
+    `files` are (name, path or file object) pairs; only container headers are read.
+    `outputs` are the (option, format_type) pairs requested for every file.
+    `file_workers` files are assumed to run at once, each splitting over `max_workers`.
+    Returns (rows, totals). A file too long for one request is marked for
+    splitting even when `split_long` is off.
+    """
+    if len(outputs) == 1:
+        prompt = build_prompt(outputs[0][1], outputs[0][0])
+    else:
+        prompt = _json_prompt("Act as a speech recognition expert.", outputs)
+    prompt_tokens = count_prompt_tokens(prompt)
+    rows, estimates = [], []
+    for name, fileobj in files:
+        info = probe_audio(fileobj)
+        threshold = CHUNK_THRESHOLD_MS if split_long else MAX_REQUEST_AUDIO_MS
+        estimate = estimate_file(info, prompt_tokens, threshold, DEFAULT_MAX_WINDOW_MS, len(outputs))
+        estimates.append(estimate)
+        rows.append({
+            "name": name,
+            "duration_ms": estimate["duration_ms"],
+            "probed": "duration_ms" in info,
+            "sample_rate": info.get("sample_rate"),
+            "channels": info.get("channels"),
+            "size_bytes": info["size_bytes"],
+            **{key: estimate[key] for key in ("split", "requests", "input_tokens", "output_tokens")},
+        })
+
+    scheduler = get_scheduler()
+    totals = {
+        "files": len(rows),
+        "duration_ms": sum(e["duration_ms"] for e in estimates),
+        "requests": sum(e["requests"] for e in estimates),
+        "input_tokens": sum(e["input_tokens"] for e in estimates),
+        "output_tokens": sum(e["output_tokens"] for e in estimates),
+        "seconds": predict_wall_clock(
+            estimates, file_workers, max_workers, model_speed(get_metrics().snapshot()),
+            scheduler.rpm, scheduler.tpm
+        ),
+        "needs_split": any(e["split"] for e in estimates) and not split_long,
+    }
+    return rows, totals
+
+
+def output_field(option, format_type):
+    """JSON field name for one requested output, e.g. translate_bullet_points."""
+    return re.sub(r"\W+", "_", f"{option} {format_type.split(' (')[0]}").strip("_").lower()
+
+
+def describe_output(option, format_type):
+    if format_type == SPEAKER_FORMAT:
+        language = "" if option == "Transcribe" else ", translated to English"
+        return f"{SEGMENT_INSTRUCTIONS}{language}"
+    if option == "Transcribe":
+        return f"a complete transcript in {format_type} format"
+    return f"an English translation in {format_type} format"
+
+
+def output_label(option, format_type, outputs):
+    """Value of the "Format Chosen" column; names the task only when several were requested."""
+    if len({task for task, _ in outputs}) > 1:
+        return f"{format_type} ({option})"
+    return format_type
+
+
+def route_models(duration_ms, outputs, quality=MODEL_QUALITY):
+    """(allowed, fallbacks) model lists for a recording of `duration_ms` producing `outputs` (see ModelRouter.route)."""
+    return get_router().route(duration_ms, outputs, quality, estimate_audio_tokens(duration_ms))
+
+
+def _generate(contents, estimated_tokens, on_chunk=None, generation_config=None, models=None):
+    """Send one request through the scheduler; returns (response text or "", model name).
+
+    `models` are tried in order: when one is out of quota or times out after
+    FALLBACK_RETRIES retries, the request moves on to the next.
+    """
+    models = models or [MODEL_NAME]
+    for position, model_name in enumerate(models):
+        model = get_model(model_name, generation_config)
+        timing = {}
+
+        def request(model=model, timing=timing):
+            started = time.perf_counter()
+            if not on_chunk:
+                response = model.generate_content(contents)
+            else:
+                # Consume the whole stream here so errors mid-stream are retried too
+                response = model.generate_content(contents, stream=True)
+                partial = ""
+                for chunk in response:
+                    if chunk.parts:
+                        partial += chunk.text
+                        on_chunk(partial)
+            timing["seconds"] = time.perf_counter() - started
+            return response
+
+        last = position == len(models) - 1
+        try:
+            with get_metrics().span("model") as span:
+                response = get_scheduler().call(
+                    model_name, request, estimated_tokens, None if last else FALLBACK_RETRIES
+                )
+                usage = getattr(response, "usage_metadata", None)
+                span["tokens"] = getattr(usage, "total_token_count", None) or estimated_tokens
+        except fallback_errors():
+            if last:
+                raise
+            continue
+        get_router().record(model_name, timing["seconds"], span["tokens"])
+        return (response.text.strip() if response.text else ""), model_name
+
+
+def _generate_json(contents, outputs, estimated_tokens, models=None):
+    """Request every output in one structured JSON response; missing fields become empty.
+
+    Returns ({output: text}, model name). Raises ValueError when the response
+    is not a JSON object, e.g. because it was cut off, so nothing is cached or saved.
+    """
+    fields = [output_field(*output) for output in outputs]
+    text, model_name = _generate(contents, estimated_tokens, models=models, generation_config={
+        "response_mime_type": "application/json",
+        "response_schema": {
+            "type": "object",
+            "properties": {
+                field: SEGMENT_SCHEMA if output[1] == SPEAKER_FORMAT else {"type": "string"}
+                for output, field in zip(outputs, fields)
+            },
+            "required": fields,
+        },
+    })
+    try:
+        data = json.loads(text) if text else {}
+    except ValueError as error:
+        raise ValueError(f"{model_name} returned invalid or truncated JSON: {error}") from error
+    if not isinstance(data, dict):
+        raise ValueError(f"{model_name} returned JSON that is not an object")
+    return {output: _output_text(output, data.get(field)) for output, field in zip(outputs, fields)}, model_name
+
+
+def _output_text(output, value):
+    """Text of one JSON field; speaker segments are rendered as timestamped turns."""
+    if output[1] == SPEAKER_FORMAT and isinstance(value, list):
+        return render_conversation(normalize_segments(value))
+    return str(value or "").strip()
+
+
+def _json_prompt(intro, outputs):
+    lines = [intro, "Return a JSON object with these fields:"]
+    lines += [f"- {output_field(*output)}: {describe_output(*output)}." for output in outputs]
+    return "\n".join(lines)
+
+
+def _can_derive(output, source_format):
+    # Speaker labels only exist in a conversation-style transcript
+    return output[1] != SPEAKER_FORMAT or source_format == SPEAKER_FORMAT
+
+
+def transcribe_outputs(audio_path, outputs, on_chunk=None, route=None):
+    """Produce several (option, format_type) outputs for one file with as little audio traffic as possible.
+
+    Each output is cached on its own. Missing outputs are derived with a
+    text-only call when a verbatim transcript of the audio is already cached,
+    and the rest come from a single audio request (structured JSON when more
+    than one is needed, or for speaker segments). Returns
+    {(option, format_type): text}.
+
+    `on_chunk(text_so_far)` follows the first output; it streams only when
+    that output is the one audio request made, otherwise it gets the final text.
+    `route` is the (allowed, fallbacks) pair to use (see route_models), by
+    default routed on this file's duration. Only output from an allowed model
+    counts as cached; fallbacks are called when every allowed model fails.
+    """
+    metrics = get_metrics()
+    outputs = list(dict.fromkeys(outputs))
+    allowed, fallbacks = route or route_models(probe_duration_ms(audio_path), outputs)
+    models = allowed + fallbacks
+
+    # Detect MIME type
+    with metrics.span("mime_detect"):
+        mime_type = detect_mime_type(audio_path)
+
+    with metrics.span("read_hash", nbytes=os.path.getsize(audio_path)):
+        audio_digest, audio_data = read_for_request(audio_path, INLINE_LIMIT_BYTES)
+
+    cache = get_result_cache()
+
+    def key_for(output, model_name):
+        option, format_type = output
+        return cache_key(audio_digest, build_prompt(format_type, option), model_name, option, format_type)
+
+    def cached(output, count=True):
+        # Any allowed tier's output will do; probing every tier is still one lookup
+        return cache.lookup((key_for(output, model_name) for model_name in allowed), count=count)
+
+    results = {}
+    produced_by = {}
+    with metrics.span("cache_lookup"):
+        for output in outputs:
+            text = cached(output)
+            if text is not None:
+                results[output] = text
+    missing = [output for output in outputs if output not in results]
+    streamed = False
+
+    if missing:
+        # A verbatim transcript, requested now or cached earlier, can stand in for the audio
+        source = None
+        for source_format in SOURCE_FORMATS:
+            output = ("Transcribe", source_format)
+            text = results.get(output)
+            if text is None and any(_can_derive(m, source_format) for m in missing):
+                # Not a requested output, so the probe stays out of the hit/miss counts
+                with metrics.span("cache_lookup"):
+                    text = cached(output, count=False)
+            if text:
+                source = (source_format, text)
+                break
+
+        derivable = [output for output in missing if source and _can_derive(output, source[0])]
+        if derivable:
+            prompt = _json_prompt(
+                "Below is a verbatim transcript of a recording. Working only from this transcript, "
+                "produce the requested outputs.", derivable
+            )
+            derived, model_name = _generate_json(
+                [prompt, source[1]], derivable, (len(prompt) + len(source[1])) // 4 + 1, models
+            )
+            results.update(derived)
+            produced_by.update(dict.fromkeys(derived, model_name))
+
+        remaining = [output for output in missing if output not in results]
+        if remaining:
+            # Small files go inline; large ones are uploaded once and the handle is reused
+            with metrics.span("request_build", nbytes=os.path.getsize(audio_path)):
+                audio_part = build_audio_part(audio_path, mime_type, audio_digest, INLINE_LIMIT_BYTES, audio_data)
+            duration_ms = probe_duration_ms(audio_path)
+
+            if len(remaining) == 1 and remaining[0][1] != SPEAKER_FORMAT:
+                option, format_type = remaining[0]
+                prompt = build_prompt(format_type, option)
+                streamed = bool(on_chunk) and remaining[0] == outputs[0]
+                results[remaining[0]], produced_by[remaining[0]] = _generate(
+                    [prompt, audio_part], estimate_audio_tokens(duration_ms, prompt),
+                    on_chunk if streamed else None, models=models
+                )
+            else:
+                prompt = _json_prompt(
+                    "Act as a speech recognition expert. Listen to the audio and produce every requested output.",
+                    remaining
+                )
+                transcribed, model_name = _generate_json(
+                    [prompt, audio_part], remaining, estimate_audio_tokens(duration_ms, prompt), models
+                )
+                results.update(transcribed)
+                produced_by.update(dict.fromkeys(transcribed, model_name))
+
+        for output in missing:
+            if results[output]:
+                cache.put(key_for(output, produced_by[output]), results[output])
+            else:
+                results[output] = NO_OUTPUT
+
+    if on_chunk and not streamed:
+        on_chunk(results[outputs[0]])
+    return {output: results[output] for output in outputs}
+
+
+def transcribe_audio(audio_path, format_type, option, on_chunk=None):
+    """Transcribe or translate the given audio file, raising on failure.
+
+    When `on_chunk` is given the response is streamed and `on_chunk(text_so_far)`
+    is called as each piece arrives. The returned text is the same either way.
+    """
+    output = (option, format_type)
+    return transcribe_outputs(audio_path, [output], on_chunk)[output]
+
+
+def transcribe_long_outputs(audio_path, outputs, max_workers=MAX_WORKERS, on_chunk=None, route=None):
+    """Split long recordings at silences and produce every output for the segments in parallel.
+
+    With `on_chunk`, the stitched first output of the segments finished so far
+    (in order) is reported each time a segment completes. Segments use the
+    route of the whole recording unless `route` is given.
+    """
+    duration_ms = probe_duration_ms(audio_path)
+    route = route or route_models(duration_ms, outputs)
+    if duration_ms is None or duration_ms <= CHUNK_THRESHOLD_MS:
+        return transcribe_outputs(audio_path, outputs, on_chunk, route)
+
+    with get_metrics().span("split", nbytes=os.path.getsize(audio_path)):
+        audio = load_audio(audio_path)
+        windows = find_windows(audio)
+        segment_paths = export_windows(audio, windows)
+        del audio
+
+    finished = [None] * len(segment_paths)
+
+    def on_segment(idx, done, result):
+        finished[idx] = result
+        if not on_chunk:
+            return
+        prefix = []
+        for segment in finished:
+            if segment is None or isinstance(segment, Exception):
+                break
+            prefix.append(segment[outputs[0]])
+        if prefix:
+            on_chunk(stitch_segments(prefix, windows))
+
+    try:
+        results = run_batch(
+            segment_paths,
+            lambda path: transcribe_outputs(path, outputs, route=route),
+            max_workers=max_workers,
+            on_complete=on_segment
+        )
+    finally:
+        remove_files(segment_paths)
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    for result, window in zip(results, windows):
+        for output in outputs:
+            result[output] = _to_recording_time(output, result[output], window)
+
+    return {output: stitch_segments([result[output] for result in results], windows) for output in outputs}
+
+
+def _to_recording_time(output, text, window):
+    """Move speaker segment times, which are relative to their window, onto the whole recording."""
+    start, end = window
+    if output[1] != SPEAKER_FORMAT or not start:
+        return text
+    return reproject_timestamps(text, [(0, start, end - start)])
+
+
+def transcribe_long_audio(audio_path, format_type, option, max_workers=MAX_WORKERS, on_chunk=None):
+    """Split long recordings at silences and transcribe the segments in parallel."""
+    output = (option, format_type)
+    return transcribe_long_outputs(audio_path, [output], max_workers, on_chunk)[output]
+
+
+def find_duplicate(fp, outputs):
+    """Best indexed recording that `fp` contains and that has every output saved.
+
+    Excerpts of an indexed recording do not count: its saved transcript also
+    covers audio the excerpt lacks, so those are transcribed afresh.
+    Returns (match, {output: stored text}) or (None, None).
+    """
+    for match in get_fingerprint_index().match(fp):
+        if match["reference_coverage"] < MIN_COVERAGE:
+            continue
+        result_ids = {(option, format_type): result_id for option, format_type, result_id in match["outputs"]}
+        if not all(output in result_ids for output in outputs):
+            continue
+        rows = get_results_store().get(result_ids[output] for output in outputs)
+        texts = {output: (rows.get(result_ids[output]) or {}).get("Transcript/Translation") for output in outputs}
+        if all(text and text != NO_OUTPUT for text in texts.values()):
+            return match, texts
+    return None, None
+
+
+def remember_recording(name, fp, outputs, result_ids):
+    """Index a processed recording's fingerprint with the result rows saved for it."""
+    outputs = list(dict.fromkeys(outputs))
+    with get_metrics().span("fingerprint_index"):
+        get_fingerprint_index().add(name, fp, [(*output, result_id) for output, result_id in zip(outputs, result_ids)])
+
+
+def transcribe_around(audio_path, match, stored, outputs, split_long=True, max_workers=MAX_WORKERS, route=None):
+    """Reuse `stored` outputs for the part of the file `match` covers and transcribe only the rest."""
+    outputs = list(dict.fromkeys(outputs))
+    duration_ms = match["query_duration_ms"]
+    covered = (max(0, -match["offset_ms"]), min(duration_ms, max(0, -match["offset_ms"]) + match["duration_ms"]))
+    windows = [window for window in ((0, covered[0]), (covered[1], duration_ms))
+               if window[1] - window[0] >= MIN_NEW_AUDIO_MS]
+    parts = {covered: {output: reproject_timestamps(text, shift_map(match)) for output, text in stored.items()}}
+    if windows:
+        with get_metrics().span("split", nbytes=os.path.getsize(audio_path)):
+            audio = load_audio(audio_path)
+            paths = export_windows(audio, windows)
+            del audio
+        try:
+            for path, window in zip(paths, windows):
+                texts = (transcribe_long_outputs(path, outputs, max_workers, route=route) if split_long
+                         else transcribe_outputs(path, outputs, route=route))
+                parts[window] = {output: _to_recording_time(output, text, window) for output, text in texts.items()}
+        finally:
+            remove_files(paths)
+    order = sorted(parts)
+    return {output: stitch_segments([parts[window][output] for window in order], order) for output in outputs}
+
+
+def process_file(name, audio_path, outputs, split_long=True, compress=False, codec="Opus",
+                 bitrate=DEFAULT_BITRATE, max_workers=MAX_WORKERS, on_chunk=None, vad=False, dedupe=False,
+                 quality=MODEL_QUALITY):
+    """Run one file through preprocessing and transcription.
+
+    `outputs` is a list of (option, format_type) pairs, all produced from one
+    pass over the audio. With `vad`, long non-speech stretches are cut out
+    first and timestamps in the output are moved back onto the original
+    recording. With `dedupe`, the file is fingerprinted first; if it is the
+    same audio as an indexed recording (each covers the other), that
+    recording's saved outputs are reused, and if it contains an indexed
+    recording, only the audio around it is sent.
+    Requests are routed on the original recording's length at `quality`.
+
+    Returns (entries, preprocessing). entries holds one result row per output
+    with Sentiment left as None for the caller to score; conversation-style rows
+    also carry their speaker "Segments". preprocessing has "sizes",
+    (bytes_before, bytes_after) when the audio was transcoded, and "vad", the
+    trim report, each None when that step was off. With `dedupe` it also has
+    "fingerprint", for remember_recording once the entries are saved (callers
+    pop it before storing the rest), and "duplicate", a summary of the match
+    whose outputs were reused or None.
+    """
+    send_path = audio_path
+    temp_paths = []
+    preprocessing = {"sizes": None, "vad": None}
+    offset_map = []
+    texts = None
+    route = route_models(probe_duration_ms(audio_path), outputs, quality)
+    if dedupe:
+        with get_metrics().span("fingerprint", nbytes=os.path.getsize(audio_path)):
+            preprocessing["fingerprint"] = fingerprint_file(audio_path)
+        match, stored = find_duplicate(preprocessing["fingerprint"], outputs)
+        preprocessing["duplicate"] = None
+        if match:
+            # The recordings cover each other, so the saved transcript is this file's transcript
+            same = match["query_coverage"] >= MIN_COVERAGE
+            preprocessing["duplicate"] = {
+                "name": match["name"],
+                "coverage_pct": round(100 * match["query_coverage"]),
+                "offset_ms": match["offset_ms"],
+                "reused": "all" if same else "partial",
+            }
+            if same:
+                texts = {output: reproject_timestamps(stored[output], shift_map(match)) for output in stored}
+            else:
+                texts = transcribe_around(audio_path, match, stored, outputs, split_long, max_workers, route)
+            if on_chunk:
+                on_chunk(next(iter(texts.values())))
+
+    if texts is None:
+        try:
+            if vad:
+                with get_metrics().span("vad", nbytes=os.path.getsize(audio_path)):
+                    # Keep the trimmed copy lossless when it will be transcoded again
+                    send_path, offset_map, preprocessing["vad"] = trim_non_speech(
+                        audio_path, export_format="flac" if compress else "mp3"
+                    )
+                if send_path != audio_path:
+                    temp_paths.append(send_path)
+
+            if compress:
+                with get_metrics().span("transcode") as span:
+                    send_path, _, bytes_before, bytes_after = transcode_for_speech(send_path, codec, bitrate)
+                    span["bytes"] = bytes_before
+                preprocessing["sizes"] = (bytes_before, bytes_after)
+                if send_path not in temp_paths and send_path != audio_path:
+                    temp_paths.append(send_path)
+
+            if split_long:
+                texts = transcribe_long_outputs(send_path, outputs, max_workers, on_chunk, route)
+            else:
+                texts = transcribe_outputs(send_path, outputs, on_chunk, route)
+        finally:
+            remove_files(temp_paths)
+
+    if offset_map:
+        texts = {output: reproject_timestamps(text, offset_map) for output, text in texts.items()}
+
+    entries = []
+    for (option, format_type), text in texts.items():
+        entry = {
+            "Audio File Name": name,
+            "Transcript/Translation": text,
+            "Format Chosen": output_label(option, format_type, outputs),
+            # Scored by the caller, e.g. run_queued_file or the batch CLI
+            "Sentiment": None
+        }
+        if format_type == SPEAKER_FORMAT and text != NO_OUTPUT:
+            entry["Segments"] = parse_conversation(text)
+        entries.append(entry)
+    return entries, preprocessing
+
+
+def new_live_session(format_type, option, max_workers=MAX_WORKERS):
+    """Start a rolling-window session whose windows are transcribed like any other audio.
+
+    Speaker times are moved from each window onto the session's timeline, and
+    conversation windows are joined turn by turn.
+    """
+    output = (option, format_type)
+
+    def transcribe(path, window):
+        return _to_recording_time(output, transcribe_audio(path, format_type, option), window)
+
+    join = join_conversation if format_type == SPEAKER_FORMAT else join_text
+    return LiveSession(transcribe, max_workers=max_workers, join=join)
+
+
+def save_live_session(session, name, format_type):
+    """Score a finished live session's transcript and append it to the results store."""
+    entry = {
+        "Audio File Name": name,
+        "Transcript/Translation": session.text(),
+        "Format Chosen": format_type,
+        "Sentiment": None
+    }
+    entry["Sentiment"] = analyze_sentiment(entry["Transcript/Translation"])
+    if format_type == SPEAKER_FORMAT:
+        entry["Segments"] = parse_conversation(entry["Transcript/Translation"])
+    save_results([entry])
+    return entry
+
+
+def run_queued_file(name, audio_path, settings, on_chunk):
+    """Job queue handler: process one file, score it and append it to the results store.
+
+    The returned timings summarise every stage span recorded for this file.
+    """
+    with collect() as records:
+        try:
+            entries, preprocessing = process_file(
+                name, audio_path, settings_outputs(settings),
+                split_long=settings["split_long"], compress=settings["compress"], codec=settings["codec"],
+                bitrate=settings["bitrate"], max_workers=settings["max_workers"],
+                on_chunk=on_chunk if settings["stream"] else None, vad=settings.get("vad", False),
+                dedupe=settings.get("dedupe", False), quality=settings.get("quality", MODEL_QUALITY)
+            )
+            for entry in entries:
+                entry["Sentiment"] = analyze_sentiment(entry["Transcript/Translation"])
+            result_ids = save_results(entries)
+            # Segments stay in the results store; the job keeps the row id to look them up
+            for entry, result_id in zip(entries, result_ids):
+                if entry.pop("Segments", None) is not None:
+                    entry["Result ID"] = result_id
+            fp = preprocessing.pop("fingerprint", None)
+            if fp is not None and (preprocessing["duplicate"] or {}).get("reused") != "all":
+                remember_recording(name, fp, settings_outputs(settings), result_ids)
+        finally:
+            write_metrics()
+    return {"entries": entries, **preprocessing, "timings": summarize(records)}
+
+
+def settings_outputs(settings):
+    """Requested (option, format_type) pairs of a job; jobs queued before multi-output have one."""
+    if "outputs" in settings:
+        return [tuple(output) for output in settings["outputs"]]
+    return [(settings["option"], settings["format_type"])]
+
+
+def result_entries(result):
+    """Result rows of a finished job file, including jobs stored before multi-output."""
+    return result["entries"] if "entries" in result else [result["entry"]]
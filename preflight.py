@@ -0,0 +1,270 @@
+"""Cheap pre-flight probing of uploads: duration, sample rate, tokens and time.
+
+Durations come from container headers (WAV, FLAC, MP3, Ogg, MP4/M4A) read
+with a few small seeks, so nothing is decoded before the batch starts.
+"""
+import heapq
+import os
+import struct
+
+from scheduler import AUDIO_TOKENS_PER_SECOND
+
+# Transcripts run at about 150 spoken words a minute, roughly 3.5 tokens a second
+OUTPUT_TOKENS_PER_SECOND = 3.5
+# Used until the metrics have seen real model calls
+DEFAULT_BASE_LATENCY = 3.0
+DEFAULT_SECONDS_PER_TOKEN = 0.004
+# Gemini accepts at most about 9.5 hours of audio in one prompt
+MAX_REQUEST_AUDIO_MS = int(9.5 * 60 * 60 * 1000)
+
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 layer III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],  # MPEG-2/2.5 layer III
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _file_size(f):
+    current = f.tell()
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(current)
+    return size
+
+
+def _probe_wav(f, size):
+    header = f.read(12)
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    info = {}
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            channels, sample_rate, byte_rate = struct.unpack("<HII", fmt[2:12])
+            info.update(channels=channels, sample_rate=sample_rate, byte_rate=byte_rate)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            # Streamed WAVs may leave the size at 0 or 0xFFFFFFFF
+            data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else size - f.tell()
+            if info.get("byte_rate"):
+                info["duration_ms"] = int(data_size / info["byte_rate"] * 1000)
+            break
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    return info or None
+
+
+def _probe_flac(f, size):
+    if f.read(4) != b"fLaC":
+        return None
+    block_header = f.read(4)
+    if block_header[0] & 0x7F != 0:
+        return None
+    streaminfo = f.read(34)
+    bits = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = bits >> 44
+    channels = ((bits >> 41) & 0x7) + 1
+    total_samples = bits & 0xFFFFFFFFF
+    info = {"sample_rate": sample_rate, "channels": channels}
+    if sample_rate and total_samples:
+        info["duration_ms"] = int(total_samples / sample_rate * 1000)
+    return info
+
+
+def _probe_mp3(f, size):
+    header = f.read(10)
+    offset = 0
+    if header[:3] == b"ID3":
+        # Synchsafe tag size
+        offset = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+    f.seek(offset)
+    data = f.read(4096)
+
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+            continue
+        version_bits = (data[i + 1] >> 3) & 0x3
+        layer_bits = (data[i + 1] >> 1) & 0x3
+        bitrate_index = data[i + 2] >> 4
+        rate_index = (data[i + 2] >> 2) & 0x3
+        if version_bits == 1 or layer_bits != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        bitrate = MP3_BITRATES[1 if version_bits == 3 else 2][bitrate_index] * 1000
+        sample_rate = MP3_SAMPLE_RATES[version_bits][rate_index]
+        channels = 1 if data[i + 3] >> 6 == 3 else 2
+        info = {"sample_rate": sample_rate, "channels": channels, "bitrate": bitrate}
+
+        # A Xing/Info header gives the exact frame count for VBR files
+        samples_per_frame = 1152 if version_bits == 3 else 576
+        for tag in (b"Xing", b"Info"):
+            pos = data.find(tag, i, i + 64)
+            if pos != -1 and pos + 12 <= len(data) and data[pos + 7] & 0x1:
+                frames = struct.unpack(">I", data[pos + 8:pos + 12])[0]
+                info["duration_ms"] = int(frames * samples_per_frame / sample_rate * 1000)
+                return info
+        info["duration_ms"] = int((size - offset - i) * 8 / bitrate * 1000)
+        return info
+    return None
+
+
+def _probe_ogg(f, size):
+    first = f.read(128)
+    if first[:4] != b"OggS":
+        return None
+    segments = first[26]
+    packet = first[27 + segments:]
+    info = {}
+    if packet.startswith(b"OpusHead"):
+        info["channels"] = packet[9]
+        info["sample_rate"] = struct.unpack("<I", packet[12:16])[0] or 48000
+        pre_skip = struct.unpack("<H", packet[10:12])[0]
+        granule_rate = 48000
+    elif packet[1:7] == b"vorbis":
+        info["channels"] = packet[11]
+        info["sample_rate"] = granule_rate = struct.unpack("<I", packet[12:16])[0]
+        pre_skip = 0
+    else:
+        return None
+
+    # The last page's granule position is the total sample count
+    tail_size = min(size, 65536)
+    f.seek(size - tail_size)
+    tail = f.read(tail_size)
+    pos = tail.rfind(b"OggS")
+    if pos != -1 and pos + 14 <= len(tail):
+        granule = struct.unpack("<q", tail[pos + 6:pos + 14])[0]
+        if granule > 0 and granule_rate:
+            info["duration_ms"] = int((granule - pre_skip) / granule_rate * 1000)
+    return info
+
+
+def _probe_mp4(f, size):
+    head = f.read(8)
+    if head[4:8] != b"ftyp":
+        return None
+    f.seek(0)
+    # Walk top-level boxes to moov (often at the end), then find mvhd inside it
+    offset = 0
+    while offset + 8 <= size:
+        f.seek(offset)
+        box_size, box_type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_type == b"moov":
+            moov = f.read(min(box_size - header_size, 1 << 20))
+            pos = moov.find(b"mvhd")
+            if pos == -1:
+                return None
+            version = moov[pos + 4]
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", moov[pos + 24:pos + 36])
+            else:
+                timescale, duration = struct.unpack(">II", moov[pos + 16:pos + 24])
+            info = {}
+            if timescale:
+                info["duration_ms"] = int(duration / timescale * 1000)
+            stsd = moov.find(b"mp4a")
+            if stsd != -1 and stsd + 28 <= len(moov):
+                info["channels"] = struct.unpack(">H", moov[stsd + 20:stsd + 22])[0]
+                info["sample_rate"] = struct.unpack(">H", moov[stsd + 28:stsd + 30])[0]
+            return info
+        if box_size < header_size:
+            return None
+        offset += box_size
+    return None
+
+
+def probe_audio(fileobj):
+    """Read duration_ms, sample_rate and channels from the container header.
+
+    Takes a path or any seekable binary file object, including Streamlit
+    uploads. Keys that cannot be read are left out; a file object's position
+    is restored.
+    """
+    if isinstance(fileobj, (str, os.PathLike)):
+        with open(fileobj, "rb") as f:
+            return probe_audio(f)
+    start = fileobj.tell()
+    size = _file_size(fileobj)
+    info = {"size_bytes": size}
+    try:
+        for probe in (_probe_wav, _probe_flac, _probe_ogg, _probe_mp4, _probe_mp3):
+            fileobj.seek(0)
+            try:
+                found = probe(fileobj, size)
+            except (struct.error, IndexError, KeyError, ValueError):
+                found = None
+            if found:
+                info.update(found)
+                break
+    finally:
+        fileobj.seek(start)
+    return info
+
+
+def model_speed(metrics_snapshot):
+    """Return (seconds per request, seconds per token), fitted to observed model calls if any."""
+    model = (metrics_snapshot or {}).get("model")
+    if model and model["count"] and model["tokens_total"]:
+        per_token = max(0.0, model["seconds_total"] - model["count"] * DEFAULT_BASE_LATENCY) / model["tokens_total"]
+        return DEFAULT_BASE_LATENCY, per_token or DEFAULT_SECONDS_PER_TOKEN
+    return DEFAULT_BASE_LATENCY, DEFAULT_SECONDS_PER_TOKEN
+
+
+def estimate_file(info, prompt_tokens, split_threshold_ms=None, window_ms=None, outputs=1):
+    """Estimate requests and tokens for one probed file.
+
+    Files longer than `split_threshold_ms` are counted as one request per
+    `window_ms` window, matching the chunked path. `outputs` artifacts are
+    returned by each request.
+    """
+    duration_ms = info.get("duration_ms")
+    if duration_ms is None:
+        # Unknown container: assume a 64 kbit/s stream
+        duration_ms = int(info["size_bytes"] * 8 / 64)
+    split = bool(split_threshold_ms and window_ms and duration_ms > split_threshold_ms)
+    requests = -(-duration_ms // window_ms) if split else 1
+    return {
+        "duration_ms": duration_ms,
+        "split": split,
+        "requests": requests,
+        "input_tokens": int(duration_ms / 1000 * AUDIO_TOKENS_PER_SECOND) + requests * prompt_tokens,
+        "output_tokens": int(duration_ms / 1000 * OUTPUT_TOKENS_PER_SECOND * outputs),
+    }
+
+
+def predict_wall_clock(estimates, file_workers, segment_workers, speed, rpm=None, tpm=None):
+    """Predict batch wall-clock seconds.
+
+    `file_workers` files run at once and a split file runs `segment_workers`
+    segments at once. Files are assigned longest-first to the least loaded
+    worker; the result is never below what the per-minute quotas allow.
+    """
+    per_request, per_token = speed
+    costs = []
+    for e in estimates:
+        rounds = -(-e["requests"] // max(1, segment_workers))
+        tokens_per_request = (e["input_tokens"] + e["output_tokens"]) / e["requests"]
+        costs.append(rounds * (per_request + tokens_per_request * per_token))
+
+    loads = [0.0] * max(1, file_workers)
+    for cost in sorted(costs, reverse=True):
+        heapq.heapreplace(loads, loads[0] + cost)
+    makespan = max(loads)
+
+    # Each bucket starts full, so only the excess over one minute's quota waits
+    floor = 0.0
+    if rpm:
+        floor = max(floor, (sum(e["requests"] for e in estimates) - rpm) / rpm * 60)
+    if tpm:
+        floor = max(floor, (sum(e["input_tokens"] for e in estimates) - tpm) / tpm * 60)
+    return max(makespan, floor)
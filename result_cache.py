@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Defaults for the on-disk result cache; override with RESULT_CACHE_* in .env
+DEFAULT_CACHE_DIR = os.path.join(".cache", "results")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def cache_key(audio_digest, prompt, model_name, task, format_type):
+    """Build a content-addressed key from the audio hash and everything sent with it."""
+    digest = hashlib.sha256()
+    digest.update(audio_digest.encode("ascii"))
+    for part in (prompt, model_name, task, format_type):
+        digest.update(b"\0" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Persistent cache of model output with size/age-based LRU eviction.
+
+    Each entry is one JSON file named after its key. The file's mtime is
+    refreshed on every hit and is used as the last-access time for eviction.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key, count=True):
+        """Return the cached text for `key`, or None on a miss.
+
+        `count=False` leaves the hit/miss counters alone, for probes that are
+        only part of one lookup (see `lookup`).
+        """
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                text = json.load(f)["text"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            if count:
+                self.record(False)
+            return None
+
+        if count:
+            self.record(True)
+        return text
+
+    def lookup(self, keys, count=True):
+        """Return the text of the first of `keys` that is cached, or None.
+
+        The keys are alternatives for one result, e.g. the same output from
+        each allowed model tier, so the whole lookup is one hit or miss.
+        """
+        text = None
+        for key in keys:
+            text = self.get(key, count=False)
+            if text is not None:
+                break
+        if count:
+            self.record(text is not None)
+        return text
+
+    def record(self, hit):
+        """Count one lookup as a hit or a miss."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, text):
+        """Store `text` under `key` and evict old entries if over budget."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "created": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        entries = []
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    _remove_quietly(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                _remove_quietly(path)
+                total -= size
+
+    def stats(self):
+        """Return hit/miss counters, one per logical lookup, for display."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
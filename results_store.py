@@ -0,0 +1,407 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from contextlib import closing
+from datetime import datetime
+
+import archive
+from diarization import SegmentTable
+from search_index import (
+    create_index, index_results, index_stats, last_indexed_id, register_functions, search, DEFAULT_LIMIT
+)
+
+DEFAULT_DB_PATH = "results.db"
+
+# Column names as they appear in the Excel and text exports
+COLUMNS = {
+    "audio_file_name": "Audio File Name",
+    "transcript": "Transcript/Translation",
+    "format_chosen": "Format Chosen",
+    "sentiment": "Sentiment",
+}
+# Transcripts live in the archive; results.transcript is only set on rows saved before it existed
+SELECT_COLUMNS = f"{', '.join(COLUMNS)}, transcript_hash"
+
+
+# Serialises incremental exports to the same file within this process only. Other
+# processes are kept safe by never changing an export in place: each one is built
+# in a temporary file and swapped in with os.replace, so the last complete file wins
+_export_locks = {}
+_export_locks_guard = threading.Lock()
+
+
+def _export_lock(path):
+    with _export_locks_guard:
+        return _export_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _stamp(stat):
+    """Size and modification time, which tell apart the files swapped in by different exports."""
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_export_state(path):
+    """Return (last exported row id, stamp of the file written then) recorded for an export."""
+    try:
+        with open(f"{path}.state", "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return int(state["last_id"]), state["stamp"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0, None
+
+
+def _is_current(path, stamp):
+    try:
+        return _stamp(os.stat(path)) == stamp
+    except OSError:
+        return False
+
+
+def _temp_path_for(path):
+    """A fresh temporary file next to `path`, so it can replace `path` atomically."""
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    return tmp_path
+
+
+def _copy_export(path, stamp, tmp_path):
+    """Copy `path` to `tmp_path` if it is still the file `stamp` was taken of; returns whether it was.
+
+    The stamp is checked on the open file, so a file another process swaps in
+    meanwhile is never copied under this state.
+    """
+    try:
+        with open(path, "rb") as src:
+            if _stamp(os.fstat(src.fileno())) != stamp:
+                return False
+            with open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+    except OSError:
+        return False
+    return True
+
+
+def _write_export_state(path, last_id, stamp):
+    tmp_path = _temp_path_for(f"{path}.state")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "stamp": stamp}, f)
+    os.replace(tmp_path, f"{path}.state")
+
+
+def format_text_entry(entry):
+    """One result as it appears in the text report and in per-file TXT exports."""
+    return (
+        f"Audio File Name: {entry['Audio File Name']}\n"
+        f"Transcript/Translation: {entry['Transcript/Translation']}\n"
+        f"Format Chosen: {entry['Format Chosen']}\n"
+        f"Sentiment: {entry['Sentiment']}\n"
+    )
+
+
+def zip_member_name(row_id, entry):
+    stem = os.path.splitext(entry["Audio File Name"] or "result")[0]
+    label = f"{stem}_{entry['Format Chosen']}" if entry["Format Chosen"] else stem
+    return f"{row_id:05d}_{re.sub(r'[^A-Za-z0-9._-]+', '_', label).strip('_')[:80]}.txt"
+
+
+def day_key(when=None):
+    """Day label used in result file names, e.g. 05_14_25."""
+    return (when or datetime.now()).strftime("%m_%d_%y")
+
+
+class ResultsStore:
+    """Append-only SQLite store for processed results.
+
+    WAL mode lets several Streamlit sessions append at the same time while
+    exports read a consistent snapshot. Each save only writes the new rows.
+    Transcripts are kept once each, compressed, in the archive tables and
+    rows point at them by content hash.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    day TEXT NOT NULL,
+                    saved_at TEXT NOT NULL,
+                    audio_file_name TEXT,
+                    transcript TEXT,
+                    format_chosen TEXT,
+                    sentiment TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_day ON results (day, id)")
+            # Speaker segments of conversation-style results, one serialized SegmentTable per row
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_segments (result_id INTEGER PRIMARY KEY, data BLOB NOT NULL)"
+            )
+            if "transcript_hash" not in [row[1] for row in conn.execute("PRAGMA table_info(results)")]:
+                conn.execute("ALTER TABLE results ADD COLUMN transcript_hash TEXT")
+            archive.create_archive(conn)
+            replaced_index = create_index(conn)
+            conn.commit()
+            # Rows saved before the index existed
+            self._index_missing(conn)
+            # Rows saved before the archive existed; reclaim the space either left behind
+            if self._archive_missing(conn) or replaced_index:
+                conn.execute("VACUUM")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        register_functions(conn)
+        return conn
+
+    def append(self, data, when=None):
+        """Append result dicts (keyed by the export column names) in one transaction.
+
+        Entries with "Segments" also get their columnar SegmentTable. Returns
+        the new row ids in order.
+        """
+        when = when or datetime.now()
+        rows = [
+            (day_key(when), when.isoformat(timespec="seconds"))
+            + tuple(entry.get(label) for label in COLUMNS.values())
+            for entry in data
+        ]
+        transcript = list(COLUMNS).index("transcript") + 2
+        with closing(self._connect()) as conn:
+            with conn:
+                indexed = []
+                for row, entry in zip(rows, data):
+                    text = row[transcript]
+                    blob_hash = archive.put(conn, str(text)) if text is not None else None
+                    cursor = conn.execute(
+                        f"INSERT INTO results (day, saved_at, {SELECT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row[:transcript] + (None,) + row[transcript + 1:] + (blob_hash,),
+                    )
+                    indexed.append((cursor.lastrowid, row[0], entry))
+                    if entry.get("Segments"):
+                        conn.execute(
+                            "INSERT INTO result_segments (result_id, data) VALUES (?, ?)",
+                            (cursor.lastrowid, SegmentTable.from_segments(entry["Segments"]).to_bytes()),
+                        )
+                # Indexed in the same transaction, so search never misses a saved result
+                index_results(conn, indexed)
+                archive.maybe_build_dictionary(conn)
+        return [result_id for result_id, _, _ in indexed]
+
+    @staticmethod
+    def _entries(conn, rows):
+        """Result dicts for rows ending in (*COLUMNS, transcript_hash), with archived transcripts read back."""
+        texts = archive.get_many(conn, [row[-1] for row in rows if row[-1]])
+        entries = []
+        for row in rows:
+            entry = dict(zip(COLUMNS.values(), row[-len(COLUMNS) - 1:-1]))
+            if row[-1]:
+                entry["Transcript/Translation"] = texts.get(row[-1])
+            entries.append(entry)
+        return entries
+
+    def _archive_missing(self, conn, batch_size=500):
+        """Move transcripts stored inline by older versions into the archive; returns how many were moved."""
+        moved = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, transcript FROM results WHERE transcript IS NOT NULL LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany(
+                    "UPDATE results SET transcript = NULL, transcript_hash = ? WHERE id = ?",
+                    [(archive.put(conn, text), row_id) for row_id, text in rows]
+                )
+                archive.maybe_build_dictionary(conn)
+            moved += len(rows)
+        return moved
+
+    def archive_stats(self):
+        """Stored transcripts, result rows, the archive's raw and compressed sizes and the search index's size."""
+        with closing(self._connect()) as conn:
+            stats = archive.stats(conn)
+            stats.update(index_stats(conn))
+            stats["rows"] = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return stats
+
+    def segments(self, result_id):
+        """The SegmentTable saved with a result, or None if it has none."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT data FROM result_segments WHERE result_id = ?", (result_id,)).fetchone()
+        return SegmentTable.from_bytes(row[0]) if row else None
+
+    def _index_missing(self, conn, batch_size=500):
+        after_id = last_indexed_id(conn)
+        while True:
+            rows = conn.execute(
+                f"SELECT id, day, {SELECT_COLUMNS} FROM results WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                entries = self._entries(conn, rows)
+                # Index conversation rows by their saved segments, as append does
+                segments = dict(conn.execute(
+                    f"SELECT result_id, data FROM result_segments WHERE result_id IN ({', '.join('?' * len(rows))})",
+                    [row[0] for row in rows]
+                ).fetchall())
+                for row, entry in zip(rows, entries):
+                    if row[0] in segments:
+                        entry["Segments"] = SegmentTable.from_bytes(segments[row[0]]).rows()
+                index_results(conn, [(row[0], row[1], entry) for row, entry in zip(rows, entries)])
+            after_id = rows[-1][0]
+
+    def search(self, query, limit=DEFAULT_LIMIT, days=None, formats=None, sentiments=None):
+        """Ranked segment hits for `query` across every saved transcript."""
+        with closing(self._connect()) as conn:
+            return search(conn, query, limit, days, formats, sentiments)
+
+    def days(self):
+        """Days that have saved results, newest first."""
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT day FROM results GROUP BY day ORDER BY MAX(id) DESC")]
+
+    def formats(self):
+        """Distinct "Format Chosen" values of saved results."""
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT DISTINCT format_chosen FROM results WHERE format_chosen IS NOT NULL ORDER BY format_chosen"
+            )]
+
+    def get(self, result_ids):
+        """Result dicts by row id; ids that do not exist are left out."""
+        result_ids = list(result_ids)
+        if not result_ids:
+            return {}
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT id, {SELECT_COLUMNS} FROM results WHERE id IN ({', '.join('?' * len(result_ids))})",
+                result_ids
+            ).fetchall()
+            return {row[0]: entry for row, entry in zip(rows, self._entries(conn, rows))}
+
+    def iter_rows(self, day=None, batch_size=500, after_id=0, with_ids=False):
+        """Yield result dicts for `day` (default today) in insertion order.
+
+        Only rows with an id above `after_id` are read. With `with_ids`,
+        (id, dict) pairs are yielded instead.
+        """
+        day = day or day_key()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                f"SELECT id, {SELECT_COLUMNS} FROM results WHERE day = ? AND id > ? ORDER BY id",
+                (day, after_id)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row, entry in zip(rows, self._entries(conn, rows)):
+                    yield (row[0], entry) if with_ids else entry
+
+    def last_id(self, day=None):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT MAX(id) FROM results WHERE day = ?", (day or day_key(),)).fetchone()
+            return row[0] or 0
+
+    def count(self, day=None):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM results WHERE day = ?", (day or day_key(),)).fetchone()[0]
+
+    def export_excel(self, path, day=None):
+        """Write the day's results to an Excel workbook, streaming rows so memory stays flat.
+
+        Workbooks cannot be appended to, so the file is rebuilt, and swapped in
+        once complete, only when rows were saved since it was last written.
+        """
+        with _export_lock(path):
+            last_id, stamp = _read_export_state(path)
+            if last_id and last_id == self.last_id(day) and _is_current(path, stamp):
+                return path
+            from openpyxl import Workbook
+
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(list(COLUMNS.values()))
+            last_id = 0
+            for last_id, entry in self.iter_rows(day, with_ids=True):
+                sheet.append(list(entry.values()))
+            # Another process may be exporting the same day; never share its half-written file
+            tmp_path = _temp_path_for(path)
+            try:
+                workbook.save(tmp_path)
+                stamp = _stamp(os.stat(tmp_path))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            _write_export_state(path, last_id, stamp)
+        return path
+
+    def _update_export(self, path, day, add_rows):
+        """Copy what `path` already holds, let `add_rows(tmp_path, last_id)` add the rest, then swap it in.
+
+        The file is never changed in place, so readers and other processes
+        only ever see a complete export. It is rebuilt from the first row when
+        it is not the file its state was recorded for, e.g. because another
+        process swapped in its own copy since. `add_rows` returns the last row
+        id it wrote.
+        """
+        last_id, stamp = _read_export_state(path)
+        newest_id = self.last_id(day)
+        if last_id and last_id == newest_id and _is_current(path, stamp):
+            return path
+        tmp_path = _temp_path_for(path)
+        try:
+            if last_id > newest_id or not _copy_export(path, stamp, tmp_path):
+                last_id = 0
+            last_id = add_rows(tmp_path, last_id)
+            stamp = _stamp(os.stat(tmp_path))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        _write_export_state(path, last_id, stamp)
+        return path
+
+    def export_text(self, path, day=None):
+        """Bring the day's plain text report up to date, appending only rows not yet in it."""
+        def add_rows(tmp_path, last_id):
+            with open(tmp_path, "a", encoding="utf-8") as file:
+                for row_id, entry in self.iter_rows(day, after_id=last_id, with_ids=True):
+                    file.write(format_text_entry(entry))
+                    file.write("\n" + "-" * 60 + "\n\n")
+                    last_id = row_id
+            return last_id
+
+        with _export_lock(path):
+            return self._update_export(path, day, add_rows)
+
+    def export_zip(self, path, day=None):
+        """Bring the day's ZIP of per-file TXT results up to date, adding only new rows."""
+        def add_rows(tmp_path, last_id):
+            try:
+                zip_file = zipfile.ZipFile(tmp_path, "a" if last_id else "w", zipfile.ZIP_DEFLATED)
+            except zipfile.BadZipFile:
+                last_id = 0
+                zip_file = zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED)
+            with zip_file:
+                for row_id, entry in self.iter_rows(day, after_id=last_id, with_ids=True):
+                    zip_file.writestr(zip_member_name(row_id, entry), format_text_entry(entry))
+                    last_id = row_id
+            return last_id
+
+        with _export_lock(path):
+            return self._update_export(path, day, add_rows)
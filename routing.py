@@ -0,0 +1,111 @@
+"""Choose a model for each request from a routing table and track how fast each model answers.
+
+Every model has a quality tier. The routing table maps a recording's
+duration, task and format to the lowest tier allowed, and the quality setting
+moves that floor up or down. Of the models on or above the floor, the one
+expected to answer soonest goes first. The rest follow as fallbacks for when
+a model runs out of quota or times out.
+"""
+import json
+import threading
+
+# Quality tier and, until calls have been observed, assumed speed of each model
+DEFAULT_MODELS = {
+    "models/gemini-2.5-flash-lite": {"quality": 1, "seconds_per_request": 2.0, "seconds_per_token": 0.002},
+    "models/gemini-2.5-flash": {"quality": 2, "seconds_per_request": 3.0, "seconds_per_token": 0.004},
+    "models/gemini-2.5-pro": {"quality": 3, "seconds_per_request": 6.0, "seconds_per_token": 0.012},
+}
+# Used where a single model is needed, e.g. for counting prompt tokens
+DEFAULT_MODEL = "models/gemini-2.5-flash"
+# First matching rule wins; a rule without a key matches anything for it
+DEFAULT_ROUTES = [
+    # Telling speakers apart is where the small model slips most
+    {"formats": ["Conversation style (identify speakers)"], "min_quality": 2},
+    {"tasks": ["Translate"], "min_quality": 2},
+    {"max_duration_ms": 2 * 60 * 1000, "min_quality": 1},
+    {"min_quality": 2},
+]
+# Added to every rule's min_quality
+QUALITY_LEVELS = {"Fast": -1, "Balanced": 0, "Best": 1}
+DEFAULT_QUALITY = "Balanced"
+# Weight of the newest call in each model's moving average
+LATENCY_SMOOTHING = 0.2
+
+
+def load_routing(path=None):
+    """(models, routes) from a JSON file with "models" and/or "routes", or the defaults."""
+    if not path:
+        return DEFAULT_MODELS, DEFAULT_ROUTES
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return config.get("models", DEFAULT_MODELS), config.get("routes", DEFAULT_ROUTES)
+
+
+class ModelRouter:
+    """Ranks models for a request and keeps a moving average of each model's latency."""
+
+    def __init__(self, models=None, routes=None):
+        self.models = models or DEFAULT_MODELS
+        self.routes = routes or DEFAULT_ROUTES
+        self._latency = {}
+        self._lock = threading.Lock()
+
+    def min_quality(self, duration_ms, outputs, quality=DEFAULT_QUALITY):
+        """Lowest tier allowed for a request producing every (option, format_type) in `outputs`."""
+        floor = 0
+        for option, format_type in outputs:
+            for rule in self.routes:
+                if "tasks" in rule and option not in rule["tasks"]:
+                    continue
+                if "formats" in rule and format_type not in rule["formats"]:
+                    continue
+                if "max_duration_ms" in rule and (duration_ms is None or duration_ms > rule["max_duration_ms"]):
+                    continue
+                floor = max(floor, rule["min_quality"])
+                break
+        tiers = [model["quality"] for model in self.models.values()]
+        return min(max(tiers), max(min(tiers), floor + QUALITY_LEVELS.get(quality, 0)))
+
+    def expected_seconds(self, model_name, tokens):
+        with self._lock:
+            observed = self._latency.get(model_name)
+        per_request, per_token = observed or (
+            self.models[model_name]["seconds_per_request"], self.models[model_name]["seconds_per_token"]
+        )
+        return per_request + per_token * tokens
+
+    def route(self, duration_ms, outputs, quality=DEFAULT_QUALITY, tokens=0):
+        """(allowed, fallbacks): models on or above the floor fastest first, then lower tiers best first.
+
+        Fallbacks are only for when every allowed model fails; their output
+        does not meet the floor, so it should not satisfy a later request.
+        """
+        floor = self.min_quality(duration_ms, outputs, quality)
+        allowed = sorted(
+            (name for name, model in self.models.items() if model["quality"] >= floor),
+            key=lambda name: self.expected_seconds(name, tokens)
+        )
+        lower = sorted(
+            (name for name, model in self.models.items() if model["quality"] < floor),
+            key=lambda name: -self.models[name]["quality"]
+        )
+        return allowed, lower
+
+    def record(self, model_name, seconds, tokens):
+        """Fold one finished call into the model's latency estimate."""
+        model = self.models.get(model_name, {})
+        per_request = model.get("seconds_per_request", 0.0)
+        per_token = max(0.0, seconds - per_request) / tokens if tokens else model.get("seconds_per_token", 0.0)
+        with self._lock:
+            if model_name in self._latency:
+                _, previous = self._latency[model_name]
+                per_token = previous + LATENCY_SMOOTHING * (per_token - previous)
+            self._latency[model_name] = (per_request, per_token)
+
+    def stats(self):
+        """Observed seconds per request and per 1k tokens for each model called so far."""
+        with self._lock:
+            return {
+                name: {"seconds_per_request": per_request, "seconds_per_1k_tokens": round(per_token * 1000, 2)}
+                for name, (per_request, per_token) in self._latency.items()
+            }
@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+# Per-model limits; override with GEMINI_RPM / GEMINI_TPM in .env
+DEFAULT_RPM = 60
+DEFAULT_TPM = 1_000_000
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 60.0
+# Consecutive failures that open the circuit, and how long it stays open
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30.0
+# Audio is billed at about 32 tokens per second
+AUDIO_TOKENS_PER_SECOND = 32
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a model keeps failing and the circuit stays open past the retry budget."""
+
+
+# The error tuples name google.api_core exceptions, which load with the SDK, so they are
+# resolved on first use rather than at import
+@lru_cache(maxsize=None)
+def retryable_errors():
+    """Errors worth retrying on the same model after a backoff."""
+    from google.api_core import exceptions as api_exceptions
+
+    return (
+        api_exceptions.ResourceExhausted,
+        api_exceptions.TooManyRequests,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.InternalServerError,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.GatewayTimeout,
+        ConnectionError,
+        TimeoutError,
+    )
+
+
+@lru_cache(maxsize=None)
+def fallback_errors():
+    """Errors after which another model is worth trying: quota exhausted, timed out or circuit open."""
+    from google.api_core import exceptions as api_exceptions
+
+    return (
+        api_exceptions.ResourceExhausted,
+        api_exceptions.TooManyRequests,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.GatewayTimeout,
+        TimeoutError,
+        CircuitOpenError,
+    )
+
+
+def estimate_audio_tokens(duration_ms, prompt=""):
+    """Rough input token count for a request with audio of the given length."""
+    return int((duration_ms or 0) / 1000 * AUDIO_TOKENS_PER_SECOND) + len(prompt) // 4 + 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously up to `capacity` per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available and take them; returns seconds waited."""
+        # A request larger than the whole bucket would never fit; let it through on a full bucket
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Take (or give back, if negative) tokens after the real usage is known."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class CircuitBreaker:
+    """Opens after repeated failures so callers back off from a failing model together."""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, cooldown=DEFAULT_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def wait_time(self):
+        """Seconds until a request may be sent; 0 when closed or half-open."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if self.wait_time() > 0 else "half-open"
+
+
+class RequestScheduler:
+    """Throttles, retries and accounts for model calls, per model name."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._tokens = {}
+        self._breakers = {}
+        self._counters = defaultdict(lambda: defaultdict(float))
+
+    def _limits_for(self, model_name):
+        with self._lock:
+            if model_name not in self._requests:
+                self._requests[model_name] = TokenBucket(self.rpm)
+                self._tokens[model_name] = TokenBucket(self.tpm)
+                self._breakers[model_name] = CircuitBreaker()
+            return self._requests[model_name], self._tokens[model_name], self._breakers[model_name]
+
+    def _count(self, model_name, counter, amount=1):
+        with self._lock:
+            self._counters[model_name][counter] += amount
+
+    def _backoff(self, attempt):
+        # Full jitter keeps many workers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, model_name, request, estimated_tokens=1, max_retries=None):
+        """Run `request()` under the model's limits, retrying retryable errors.
+
+        `request` returns the Gemini response; its usage metadata, when present,
+        corrects the token bucket and the quota counters. `max_retries`
+        overrides the scheduler's default, e.g. to give up early when another
+        model can take the request.
+        """
+        requests_bucket, tokens_bucket, breaker = self._limits_for(model_name)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        for attempt in range(max_retries + 1):
+            wait = breaker.wait_time()
+            if wait > 0:
+                if attempt == max_retries:
+                    raise CircuitOpenError(f"{model_name} is failing; circuit open for {wait:.0f}s more")
+                time.sleep(wait)
+
+            throttled = requests_bucket.acquire(1) + tokens_bucket.acquire(estimated_tokens)
+            self._count(model_name, "throttled_seconds", throttled)
+            self._count(model_name, "requests")
+
+            try:
+                response = request()
+            except retryable_errors():
+                breaker.record_failure()
+                self._count(model_name, "retryable_errors")
+                if attempt == max_retries:
+                    self._count(model_name, "failures")
+                    raise
+                self._count(model_name, "retries")
+                time.sleep(self._backoff(attempt))
+                continue
+            except Exception:
+                self._count(model_name, "failures")
+                raise
+
+            breaker.record_success()
+            used = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
+            if used:
+                tokens_bucket.adjust(used - estimated_tokens)
+            self._count(model_name, "tokens", used or estimated_tokens)
+            return response
+
+    def stats(self):
+        """Return quota counters and circuit state for each model used so far."""
+        with self._lock:
+            models = list(self._counters)
+            counters = {model: dict(values) for model, values in self._counters.items()}
+        return {
+            model: {
+                "requests": int(counters[model].get("requests", 0)),
+                "retries": int(counters[model].get("retries", 0)),
+                "failures": int(counters[model].get("failures", 0)),
+                "tokens": int(counters[model].get("tokens", 0)),
+                "throttled_seconds": round(counters[model].get("throttled_seconds", 0.0), 1),
+                "circuit": self._limits_for(model)[2].state,
+            }
+            for model in models
+        }
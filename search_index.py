@@ -0,0 +1,182 @@
+"""SQLite FTS5 full-text index over saved transcripts.
+
+Each transcript is indexed per speaker turn or paragraph, so a hit points at
+the segment (and its timestamp, when known) rather than the whole file. The
+index lives in the results database and is written in the same transaction as
+the result rows.
+
+The FTS table is external-content: it keeps only its inverted index, and
+segment text for snippets is read back through a view over the compressed
+transcript archive. Speaker, timestamp and segment number are kept in
+transcript_segments; file name, day, format and sentiment come from results.
+"""
+import re
+import sqlite3
+from functools import lru_cache
+
+import archive
+from chunking import format_timestamp
+from diarization import SegmentTable
+from sentiment import split_segments
+
+INLINE_TIMESTAMP_RE = re.compile(r"[\[(]((?:\d{1,2}:)?\d{1,2}:\d{2})[\])]")
+DEFAULT_LIMIT = 50
+
+
+def create_index(conn):
+    """Create the index tables; returns True if an older index that stored its own text was dropped."""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'transcript_fts'").fetchone()
+    replaced = row is not None and not re.search(r"\bcontent\s*=", row[0])
+    if replaced:
+        conn.execute("DROP TABLE transcript_fts")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transcript_segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            result_id INTEGER NOT NULL,
+            segment INTEGER NOT NULL,
+            speaker TEXT,
+            timestamp TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE VIEW IF NOT EXISTS transcript_fts_content AS
+        SELECT s.id AS id,
+               segment_text(b.data, d.data, r.transcript, g.data, s.segment) AS text,
+               s.speaker AS speaker,
+               r.audio_file_name AS audio_file_name
+        FROM transcript_segments s
+        JOIN results r ON r.id = s.result_id
+        LEFT JOIN archive_blobs b ON b.hash = r.transcript_hash
+        LEFT JOIN archive_dictionaries d ON d.id = b.dictionary_id
+        LEFT JOIN result_segments g ON g.result_id = r.id
+        """
+    )
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(
+            text, speaker, audio_file_name,
+            content = 'transcript_fts_content', content_rowid = 'id',
+            tokenize = 'porter unicode61'
+        )
+        """
+    )
+    return replaced
+
+
+@lru_cache(maxsize=64)
+def _segment_texts(data, dictionary, transcript, segments):
+    if segments is not None:
+        table = SegmentTable.from_bytes(segments)
+        return [table.segment_text(i) for i in range(len(table))]
+    text = archive.decode(data, dictionary) if data is not None else transcript
+    return [segment for _, _, segment in split_segments(text or "")]
+
+
+def _segment_text(data, dictionary, transcript, segments, number):
+    texts = _segment_texts(data, dictionary, transcript, segments)
+    return texts[number - 1] if 0 < number <= len(texts) else None
+
+
+def register_functions(conn):
+    """Register segment_text(), which the index's content view needs; call on every connection."""
+    conn.create_function("segment_text", 5, _segment_text, deterministic=True)
+
+
+def last_indexed_id(conn):
+    row = conn.execute("SELECT result_id FROM transcript_segments ORDER BY id DESC LIMIT 1").fetchone()
+    return row[0] if row else 0
+
+
+def index_stats(conn):
+    """Bytes on disk of the search index's tables."""
+    try:
+        size = conn.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'transcript%'"
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        # SQLite built without the dbstat table
+        size = conn.execute("SELECT SUM(LENGTH(block)) FROM transcript_fts_data").fetchone()[0]
+    return {"index_bytes": size or 0}
+
+
+def _entry_segments(entry):
+    """(speaker, timestamp, text) per segment, from structured speaker segments when the entry has them."""
+    if entry.get("Segments"):
+        return [
+            (segment["speaker"], format_timestamp(segment["start_ms"]) if segment["start_ms"] >= 0 else None,
+             segment["text"])
+            for segment in entry["Segments"]
+        ]
+    return split_segments(entry.get("Transcript/Translation") or "")
+
+
+def index_results(conn, rows):
+    """Add (result_id, day, entry) rows to the index, one FTS row per segment."""
+    count = 0
+    for result_id, day, entry in rows:
+        for number, (speaker, timestamp, text) in enumerate(_entry_segments(entry), start=1):
+            if timestamp is None:
+                inline = INLINE_TIMESTAMP_RE.search(text)
+                timestamp = inline.group(1) if inline else None
+            segment_id = conn.execute(
+                "INSERT INTO transcript_segments (result_id, segment, speaker, timestamp) VALUES (?, ?, ?, ?)",
+                (result_id, number, speaker, timestamp),
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO transcript_fts (rowid, text, speaker, audio_file_name) VALUES (?, ?, ?, ?)",
+                (segment_id, text, speaker, entry.get("Audio File Name")),
+            )
+            count += 1
+    return count
+
+
+def _plain_query(query):
+    """Quote every word so punctuation in free text cannot break the FTS5 syntax."""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+
+def search(conn, query, limit=DEFAULT_LIMIT, days=None, formats=None, sentiments=None):
+    """Return the best matching segments for `query`, best first.
+
+    FTS5 syntax (phrases, OR, NOT, prefix*) is honoured; anything that does not
+    parse is searched as plain words. Each hit has the file, day, format,
+    sentiment, speaker, timestamp, a highlighted snippet and its bm25 score.
+    """
+    filters, params = [], []
+    for column, values in (("day", days), ("format_chosen", formats), ("sentiment", sentiments)):
+        if values:
+            filters.append(f"r.{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    sql = (
+        "SELECT r.audio_file_name, r.day, r.format_chosen, r.sentiment, s.speaker, s.timestamp, s.segment, "
+        "s.result_id, s.id, bm25(transcript_fts, 10.0, 2.0, 5.0) AS score "
+        "FROM transcript_fts JOIN transcript_segments s ON s.id = transcript_fts.rowid "
+        "JOIN results r ON r.id = s.result_id WHERE transcript_fts MATCH ?"
+        + "".join(f" AND {condition}" for condition in filters)
+        + " ORDER BY score LIMIT ?"
+    )
+    columns = ("Audio File Name", "day", "Format Chosen", "Sentiment", "speaker", "timestamp", "segment",
+               "result_id")
+
+    for match in (query, _plain_query(query)):
+        if not match:
+            return []
+        try:
+            rows = conn.execute(sql, [match, *params, limit]).fetchall()
+        except sqlite3.OperationalError:
+            continue
+        # Snippets decompress the segment's transcript, so only build them for the hits returned
+        ids = [row[8] for row in rows]
+        snippets = dict(conn.execute(
+            "SELECT rowid, snippet(transcript_fts, 0, '**', '**', ' … ', 16) FROM transcript_fts "
+            f"WHERE transcript_fts MATCH ? AND rowid IN ({', '.join('?' * len(ids))})",
+            [match, *ids]
+        ).fetchall()) if ids else {}
+        return [
+            dict(zip(columns, row[:8]), snippet=snippets.get(row[8]), score=row[9])
+            for row in rows
+        ]
+    return []
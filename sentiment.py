@@ -0,0 +1,228 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# Thresholds used for the Sentiment column
+POSITIVE_THRESHOLD = 0.1
+NEGATIVE_THRESHOLD = -0.1
+SUBJECTIVITY_THRESHOLD = 0.3
+
+SPEAKER_RE = re.compile(r"^\s*[*_]*([A-Za-z][\w .'-]{0,40}?)[*_]*\s*:\s+(.*)$")
+TIMESTAMP_RE = re.compile(r"^\s*\[(\d{2}:\d{2}:\d{2}) - \d{2}:\d{2}:\d{2}\]\s*$")
+
+
+@lru_cache(maxsize=None)
+def _build_lexicon():
+    """Flatten TextBlob's word lexicon and tokenizer rules into plain lookups.
+
+    Returns (scores, negations, emoticons, rules). scores maps each word to
+    (polarity, subjectivity, intensity, is_modifier). Built on first use so
+    importing this module does not load TextBlob.
+    """
+    from textblob import _text
+    from textblob.en import sentiment as _lexicon
+
+    scores = {
+        word: (*_lexicon[word][None], any(pos in _lexicon[word] for pos in _lexicon.modifiers))
+        for word in _lexicon
+    }
+    emoticons = {}
+    for (_, polarity), faces in _text.EMOTICONS.items():
+        for face in faces:
+            emoticons.setdefault(face.lower(), polarity)
+    return scores, frozenset(_lexicon.negations), emoticons, _text
+
+
+def label_for(polarity, subjectivity):
+    """Map polarity/subjectivity scores to Positive, Negative, Neutral or Mixed."""
+    if polarity > POSITIVE_THRESHOLD:
+        return "Positive"
+    elif polarity < NEGATIVE_THRESHOLD:
+        return "Negative"
+    else:
+        return "Neutral" if subjectivity < SUBJECTIVITY_THRESHOLD else "Mixed"
+
+
+def _split_token(token, rules, punctuation):
+    """Split leading and trailing punctuation off one token the way TextBlob's find_tokens does."""
+    head, tail = [], []
+    while token.startswith(punctuation) and token not in rules.replacements:
+        head.append(token[0])
+        token = token[1:]
+    while token.endswith(punctuation + (".",)) and token not in rules.replacements:
+        if token.endswith(punctuation):
+            tail.append(token[-1])
+            token = token[:-1]
+        if token.endswith("..."):
+            tail.append("...")
+            token = token[:-3].rstrip(".")
+        if token.endswith("."):
+            if (token in rules.ABBREVIATIONS or rules.RE_ABBR1.match(token) or rules.RE_ABBR2.match(token)
+                    or rules.RE_ABBR3.match(token)):
+                break
+            tail.append(token[-1])
+            token = token[:-1]
+    return head + ([token] if token else []) + tail[::-1]
+
+
+def _tokenize(text, rules):
+    """Lowercased tokens of `text` as TextBlob's sentiment analyzer sees them.
+
+    Same contraction, quote and punctuation splitting as find_tokens, with
+    plain words passed straight through. Sentence breaks are not needed: the
+    analyzer joins the sentences back together before scoring.
+    """
+    for old, new in rules.replacements.items():
+        text = text.replace(old, new)
+    for quote in ("“", "”", "‘", "’", "'", '"'):
+        text = text.replace(quote, f" {quote} ")
+    punctuation = tuple(rules.PUNCTUATION.replace(".", ""))
+    tokens = []
+    for token in text.split():
+        if token.isalnum():
+            tokens.append(token)
+        else:
+            tokens.extend(_split_token(token, rules, punctuation))
+    joined = rules.RE_SARCASM.sub("(!)", " ".join(tokens))
+    joined = rules.RE_EMOTICONS.sub(lambda m: m.group(1).replace(" ", "") + m.group(2), joined)
+    return joined.lower().split()
+
+
+def _score_groups(texts):
+    """Score each text with TextBlob's pattern analyzer rules in one pass over all of their tokens.
+
+    Only known words are assessed. A known modifier ("very") scales the known
+    word right after it and is not counted on its own; a negation reaches the
+    next known word across short words and punctuation ("not a good") and
+    turns its polarity into -0.5 times itself; "!" boosts the word before it
+    and emoticons and "(!)" count as words of their own.
+    Returns (polarity, subjectivity) arrays with one entry per text.
+    """
+    scores, negations, emoticons, rules = _build_lexicon()
+    groups, polarity, subjectivity, negated = [], [], [], []
+    for group, text in enumerate(texts):
+        first = len(groups)
+        intensity = 1.0
+        modifier = negation = None
+        for word in _tokenize(text, rules):
+            known = scores.get(word)
+            if known is not None:
+                p, s, i, is_modifier = known
+                if modifier is None:
+                    groups.append(group)
+                    polarity.append(p)
+                    subjectivity.append(s)
+                    negated.append(False)
+                else:
+                    polarity[-1] = max(-1.0, min(p * intensity, 1.0))
+                    subjectivity[-1] = max(-1.0, min(s * intensity, 1.0))
+                intensity = i
+                if negation is not None:
+                    intensity = 1.0 / intensity
+                    negated[-1] = True
+                modifier = word if is_modifier else None
+                negation = word if word in negations else None
+                continue
+            if word in negations:
+                negation = word
+            elif negation and len(word.strip("'")) > 1:
+                negation = None
+            # "really not good": a negation after an -ly modifier applies to the modified word
+            if negation is not None and modifier is not None and modifier.endswith("ly"):
+                negated[-1] = True
+                negation = None
+            elif modifier and len(word) > 2:
+                modifier = None
+            if word == "!" and len(groups) > first:
+                polarity[-1] = max(-1.0, min(polarity[-1] * 1.25, 1.0))
+            extra = None
+            if word == "(!)":
+                extra = (0.0, 1.0)
+            if not word.isalpha() and len(word) <= 5 and word not in rules.PUNCTUATION and word in emoticons:
+                extra = (emoticons[word], 1.0)
+            if extra:
+                groups.append(group)
+                polarity.append(extra[0])
+                subjectivity.append(extra[1])
+                negated.append(False)
+                intensity = 1.0
+
+    count = len(texts)
+    if not groups:
+        return np.zeros(count), np.zeros(count)
+
+    groups = np.asarray(groups)
+    polarity = np.asarray(polarity)
+    polarity = np.where(negated, polarity * -0.5, polarity)
+    totals = np.bincount(groups, minlength=count).astype(np.float64)
+    pol_sum = np.bincount(groups, weights=polarity, minlength=count)
+    subj_sum = np.bincount(groups, weights=subjectivity, minlength=count)
+    totals[totals == 0] = 1.0
+    return pol_sum / totals, subj_sum / totals
+
+
+def score_texts(texts):
+    """Return a (polarity, subjectivity) tuple for each text."""
+    polarity, subjectivity = _score_groups(list(texts))
+    return list(zip(polarity.tolist(), subjectivity.tolist()))
+
+
+def analyze_sentiments(texts):
+    """Return the sentiment label for each text."""
+    return [label_for(p, s) for p, s in score_texts(texts)]
+
+
+def split_segments(text):
+    """Split a transcript into (speaker, timestamp, text) segments.
+
+    Lines such as "Speaker 1: ..." start a new speaker turn and timestamp
+    headers written by the long-audio splitter set the time for what follows.
+    Transcripts without speaker labels are split into paragraphs.
+    """
+    segments = []
+    timestamp = None
+    for block in re.split(r"\n\s*\n", text):
+        current = None
+        for line in block.splitlines():
+            header = TIMESTAMP_RE.match(line)
+            if header:
+                timestamp = header.group(1)
+                current = None
+                continue
+            match = SPEAKER_RE.match(line)
+            if match:
+                current = [match.group(1).strip(), timestamp, match.group(2).strip()]
+                segments.append(current)
+            elif line.strip():
+                if current is None:
+                    current = [None, timestamp, line.strip()]
+                    segments.append(current)
+                else:
+                    current[2] += " " + line.strip()
+    return [tuple(segment) for segment in segments]
+
+
+def score_segments(texts):
+    """Score every speaker turn or paragraph of every text in a single pass.
+
+    Returns a list of dicts with the text's index, segment number, speaker,
+    timestamp, polarity, subjectivity and label.
+    """
+    rows = []
+    segment_texts = []
+    for file_index, text in enumerate(texts):
+        for number, (speaker, timestamp, segment_text) in enumerate(split_segments(text), start=1):
+            rows.append({
+                "file_index": file_index,
+                "segment": number,
+                "speaker": speaker,
+                "timestamp": timestamp,
+            })
+            segment_texts.append(segment_text)
+
+    for row, (polarity, subjectivity) in zip(rows, score_texts(segment_texts)):
+        row["polarity"] = polarity
+        row["subjectivity"] = subjectivity
+        row["sentiment"] = label_for(polarity, subjectivity)
+    return rows
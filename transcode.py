@@ -0,0 +1,80 @@
+import mimetypes
+import os
+import tempfile
+
+import ffmpeg
+
+# Speech recognition does not need more than mono 16 kHz
+DEFAULT_SAMPLE_RATE = 16000
+DEFAULT_BITRATE = "32k"
+
+CODECS = {
+    "Opus": {"acodec": "libopus", "suffix": ".ogg", "mime_type": "audio/ogg"},
+    "FLAC": {"acodec": "flac", "suffix": ".flac", "mime_type": "audio/flac"},
+}
+
+# Gemini accepts audio/wav rather than the audio/x-wav that mimetypes returns
+MIME_ALIASES = {"audio/x-wav": "audio/wav", "audio/wave": "audio/wav", "audio/x-flac": "audio/flac"}
+
+
+def sniff_mime_type(audio_path):
+    """Detect the container from the file's magic bytes."""
+    with open(audio_path, "rb") as f:
+        header = f.read(12)
+
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "audio/wav"
+    if header[:4] == b"fLaC":
+        return "audio/flac"
+    if header[:4] == b"OggS":
+        return "audio/ogg"
+    if header[4:8] == b"ftyp":
+        return "audio/mp4"
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return "audio/mpeg"
+    return None
+
+
+def detect_mime_type(audio_path, default="audio/wav"):
+    """Return the MIME type from the file contents, falling back to its extension."""
+    mime_type = sniff_mime_type(audio_path)
+    if not mime_type:
+        mime_type, _ = mimetypes.guess_type(audio_path)
+    mime_type = MIME_ALIASES.get(mime_type, mime_type)
+    return mime_type or default
+
+
+def transcode_for_speech(audio_path, codec="Opus", bitrate=DEFAULT_BITRATE, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Convert the file to mono at `sample_rate` with the chosen codec.
+
+    Returns (path, mime_type, bytes_before, bytes_after). The original file is
+    returned unchanged if the converted one would not be smaller.
+    """
+    settings = CODECS[codec]
+    bytes_before = os.path.getsize(audio_path)
+
+    with tempfile.NamedTemporaryFile(suffix=settings["suffix"], delete=False) as tmp:
+        out_path = tmp.name
+
+    output_args = {"ac": 1, "ar": sample_rate, "acodec": settings["acodec"], "vn": None}
+    if codec == "Opus":
+        output_args["audio_bitrate"] = bitrate
+
+    try:
+        (
+            ffmpeg
+            .input(audio_path)
+            .output(out_path, **output_args)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    except ffmpeg.Error:
+        os.remove(out_path)
+        raise
+
+    bytes_after = os.path.getsize(out_path)
+    if bytes_after >= bytes_before:
+        os.remove(out_path)
+        return audio_path, detect_mime_type(audio_path), bytes_before, bytes_before
+
+    return out_path, settings["mime_type"], bytes_before, bytes_after
@@ -0,0 +1,188 @@
+"""Transcribe or translate a folder of audio files without Streamlit.
+
+Example:
+    python transcribe_batch.py recordings/ --task Transcribe --format Paragraph --workers 8
+
+Finished files are recorded in a manifest so an interrupted run picks up
+where it stopped when started again with the same arguments.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+from batch import run_batch
+from transport import file_sha256
+from transcode import CODECS, DEFAULT_BITRATE
+from sentiment import analyze_sentiments
+from pipeline import (
+    MAX_WORKERS, MODEL_QUALITY, QUALITY_LEVELS, FORMAT_OPTIONS, TASK_OPTIONS, AUDIO_EXTENSIONS,
+    preflight, process_file, remember_recording, save_results, save_results_to_excel, save_results_to_text,
+    save_results_to_zip
+)
+
+DEFAULT_MANIFEST = "transcribe_manifest.jsonl"
+# Segments of one split file sent at once; each of the --workers files can run this many
+DEFAULT_SEGMENT_WORKERS = 2
+
+
+class Manifest:
+    """Append-only JSONL record of files that have been processed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["key"])
+                    except (ValueError, KeyError):
+                        continue
+
+    def record(self, key, path, status):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "path": path, "status": status, "time": time.time()}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(key)
+
+
+def collect_files(inputs):
+    """Expand directories and glob patterns into a sorted list of audio files."""
+    extensions = tuple(f".{ext}" for ext in AUDIO_EXTENSIONS)
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                found.update(os.path.join(root, n) for n in names if n.lower().endswith(extensions))
+        else:
+            found.update(p for p in glob.glob(item, recursive=True) if p.lower().endswith(extensions))
+    return sorted(found)
+
+
+def job_key(path, outputs):
+    return f"{file_sha256(path)}:" + "+".join(f"{option}:{format_type}" for option, format_type in outputs)
+
+
+def print_estimate(jobs, outputs, args):
+    """Print the pre-flight estimate for the pending files; returns the split setting to use."""
+    rows, totals = preflight(
+        [(path, path) for _, path in jobs], outputs,
+        split_long=not args.no_split, max_workers=args.segment_workers, file_workers=args.workers
+    )
+    for row in rows:
+        print(
+            f"  {row['name']}: {row['duration_ms'] / 60000:.1f} min{'' if row['probed'] else ' (guess)'}, "
+            f"{row['sample_rate'] or '?'} Hz, {row['requests']} requests, "
+            f"~{row['input_tokens'] + row['output_tokens']} tokens{', split' if row['split'] else ''}"
+        )
+    print(
+        f"Estimate: {totals['duration_ms'] / 60000:.1f} min of audio, {totals['requests']} requests, "
+        f"~{totals['input_tokens'] + totals['output_tokens']} tokens, about {totals['seconds'] / 60:.1f} min"
+    )
+    if totals["needs_split"]:
+        print("Some files are too long for a single request; they will be split despite --no-split.")
+        return True
+    return not args.no_split
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe or translate audio files in bulk.")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns")
+    parser.add_argument("--task", nargs="+", choices=TASK_OPTIONS, default=["Transcribe"],
+                        help="One or more tasks; every task/format pair comes from one pass over the audio")
+    parser.add_argument("--format", dest="format_type", nargs="+", choices=FORMAT_OPTIONS, default=["Paragraph"])
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Files processed in parallel")
+    parser.add_argument("--segment-workers", type=int, default=DEFAULT_SEGMENT_WORKERS,
+                        help="Segments of one long file sent in parallel (up to workers x this at once)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="Progress file used to resume runs")
+    parser.add_argument("--no-split", action="store_true", help="Do not split long recordings at silences")
+    parser.add_argument("--vad", action="store_true", help="Cut long silences before sending")
+    parser.add_argument("--quality", choices=list(QUALITY_LEVELS), default=MODEL_QUALITY,
+                        help="Routing bias: Fast favours smaller models, Best the strongest one")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Reuse saved transcripts of near-duplicate recordings processed before")
+    parser.add_argument("--compress", action="store_true", help="Convert to mono 16 kHz before sending")
+    parser.add_argument("--codec", choices=list(CODECS), default="Opus")
+    parser.add_argument("--bitrate", default=DEFAULT_BITRATE)
+    parser.add_argument("--export", nargs="*", choices=["excel", "text", "zip"], default=["excel", "text"],
+                        help="Files to write from today's results when the run ends")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Only print the duration, token and time estimate for the pending files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    manifest = Manifest(args.manifest)
+    outputs = [(option, format_type) for option in args.task for format_type in args.format_type]
+
+    jobs = []
+    for path in collect_files(args.inputs):
+        key = job_key(path, outputs)
+        if key not in manifest.done:
+            jobs.append((key, path))
+
+    if not jobs:
+        print("Nothing to do: all files are already in the manifest.")
+        return 0
+
+    split_long = print_estimate(jobs, outputs, args)
+    if args.estimate:
+        return 0
+
+    print(f"Processing {len(jobs)} files with up to {args.workers} in parallel ...")
+    failures = 0
+
+    def process_job(job):
+        _, path = job
+        entries, preprocessing = process_file(
+            os.path.basename(path), path, outputs,
+            split_long=split_long, compress=args.compress, codec=args.codec,
+            bitrate=args.bitrate, max_workers=args.segment_workers, vad=args.vad, dedupe=args.dedupe,
+            quality=args.quality
+        )
+        if preprocessing["vad"]:
+            print(f"{path}: {preprocessing['vad']['removed_pct']:.0f}% silence removed")
+        duplicate = preprocessing.get("duplicate")
+        if duplicate:
+            print(f"{path}: {duplicate['coverage_pct']}% matches {duplicate['name']}, reused {duplicate['reused']}")
+        labels = analyze_sentiments([entry["Transcript/Translation"] for entry in entries])
+        for entry, label in zip(entries, labels):
+            entry["Sentiment"] = label
+        # Save as soon as the file is done so an interrupted run keeps its work
+        result_ids = save_results(entries)
+        if preprocessing.get("fingerprint") is not None and (duplicate or {}).get("reused") != "all":
+            remember_recording(os.path.basename(path), preprocessing["fingerprint"], outputs, result_ids)
+        return entries
+
+    def on_complete(idx, done, result):
+        nonlocal failures
+        key, path = jobs[idx]
+        if isinstance(result, Exception):
+            failures += 1
+            print(f"[{done}/{len(jobs)}] FAILED {path}: {result}", file=sys.stderr)
+        else:
+            manifest.record(key, path, "done")
+            print(f"[{done}/{len(jobs)}] {path}: " + ", ".join(entry["Sentiment"] for entry in result))
+
+    run_batch(jobs, process_job, max_workers=args.workers, on_complete=on_complete)
+
+    if "excel" in args.export:
+        print(f"Excel results: {save_results_to_excel()}")
+    if "text" in args.export:
+        print(f"Text results: {save_results_to_text()}")
+    if "zip" in args.export:
+        print(f"Per-file TXT results: {save_results_to_zip()}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# Requests are capped at 20 MB in total, so leave room for the prompt
+DEFAULT_INLINE_LIMIT_BYTES = 15 * 1024 * 1024
+# Files API uploads are kept for 48 hours; stop reusing them a little earlier
+UPLOAD_TTL_SECONDS = 47 * 60 * 60
+UPLOAD_POLL_SECONDS = 2
+
+_uploads = {}
+_uploads_lock = threading.Lock()
+_key_locks = {}
+
+
+@lru_cache(maxsize=None)
+def get_genai():
+    """The google.generativeai module, imported and configured on first use.
+
+    Importing the SDK is slow, so it is deferred until a request is made.
+    """
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+    return genai
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hash a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _expiry_of(uploaded):
+    expiration = getattr(uploaded, "expiration_time", None)
+    if isinstance(expiration, datetime):
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        # Keep a small margin so a request never references an expiring file
+        return expiration.timestamp() - 15 * 60
+    return time.time() + UPLOAD_TTL_SECONDS
+
+
+def _wait_until_active(uploaded):
+    state = getattr(getattr(uploaded, "state", None), "name", None)
+    while state == "PROCESSING":
+        time.sleep(UPLOAD_POLL_SECONDS)
+        uploaded = get_genai().get_file(uploaded.name)
+        state = uploaded.state.name
+    if state == "FAILED":
+        raise RuntimeError(f"Upload of {uploaded.display_name} failed on the server")
+    return uploaded
+
+
+def get_uploaded_file(audio_path, mime_type, digest=None):
+    """Upload the file once per content hash and reuse the handle until it expires."""
+    digest = digest or file_sha256(audio_path)
+
+    with _uploads_lock:
+        key_lock = _key_locks.setdefault(digest, threading.Lock())
+
+    # Concurrent requests for the same audio wait for a single upload
+    with key_lock:
+        with _uploads_lock:
+            cached = _uploads.get(digest)
+        if cached and cached[1] > time.time():
+            return cached[0]
+
+        uploaded = get_genai().upload_file(path=audio_path, mime_type=mime_type)
+        uploaded = _wait_until_active(uploaded)
+        with _uploads_lock:
+            _uploads[digest] = (uploaded, _expiry_of(uploaded))
+        return uploaded
+
+
+def read_for_request(audio_path, inline_limit=DEFAULT_INLINE_LIMIT_BYTES):
+    """Hash the file, keeping its bytes only if they will be sent inline.
+
+    Returns (digest, data) where data is None for files that will go through
+    the Files API. Either way the file is read from disk once.
+    """
+    if os.path.getsize(audio_path) <= inline_limit:
+        with open(audio_path, "rb") as f:
+            data = f.read()
+        return hashlib.sha256(data).hexdigest(), data
+    return file_sha256(audio_path), None
+
+
+def build_audio_part(audio_path, mime_type, digest=None, inline_limit=DEFAULT_INLINE_LIMIT_BYTES, data=None):
+    """Return the request part for the audio: inline bytes if small, a Files API handle otherwise.
+
+    Pass `data` from read_for_request to avoid reading a small file again.
+    """
+    if data is not None:
+        return {"mime_type": mime_type, "data": data}
+    if os.path.getsize(audio_path) <= inline_limit:
+        with open(audio_path, "rb") as f:
+            return {"mime_type": mime_type, "data": f.read()}
+    return get_uploaded_file(audio_path, mime_type, digest)
@@ -0,0 +1,136 @@
+"""Energy-based voice activity detection to drop long non-speech stretches before sending.
+
+The trimmed audio keeps a short pause where each stretch was cut, and an
+offset map records where every kept region came from so timestamps in the
+transcript can be moved back onto the original recording.
+"""
+import bisect
+import re
+import tempfile
+
+import numpy as np
+from pydub import AudioSegment
+
+from chunking import format_timestamp, load_audio
+
+DEFAULT_FRAME_MS = 30
+# Only non-speech runs at least this long are removed
+DEFAULT_MIN_SILENCE_MS = 1500
+# Speech kept on either side of each region so word onsets are not clipped
+DEFAULT_PADDING_MS = 250
+# Pause left in place of each removed stretch
+DEFAULT_GAP_MS = 400
+# Frames this far above the noise floor count as speech
+DEFAULT_MARGIN_DB = 12
+# Trimming less than this is not worth re-encoding the file
+MIN_REMOVED_MS = 5000
+# Frames are measured in blocks so long recordings do not need a float copy
+BLOCK_FRAMES = 4096
+
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+TIMESTAMP_RE = re.compile(r"\b(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\b")
+BRACKETED_RE = re.compile(r"[\[(][^\[\]()\n]{0,40}[\])]")
+
+
+def frame_levels(audio, frame_ms=DEFAULT_FRAME_MS):
+    """Return the RMS level of each `frame_ms` frame in dBFS."""
+    samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_DTYPES[audio.sample_width])
+    frame_len = int(audio.frame_rate * frame_ms / 1000) * audio.channels
+    count = len(samples) // frame_len
+    full_scale = float(2 ** (8 * audio.sample_width - 1))
+
+    levels = np.empty(count, dtype=np.float64)
+    for start in range(0, count, BLOCK_FRAMES):
+        stop = min(count, start + BLOCK_FRAMES)
+        block = samples[start * frame_len:stop * frame_len].astype(np.float64).reshape(stop - start, frame_len)
+        rms = np.sqrt(np.mean(np.square(block), axis=1)) / full_scale
+        levels[start:stop] = 20 * np.log10(np.maximum(rms, 1e-10))
+    return levels
+
+
+def speech_regions(audio, frame_ms=DEFAULT_FRAME_MS, min_silence_ms=DEFAULT_MIN_SILENCE_MS,
+                   padding_ms=DEFAULT_PADDING_MS, margin_db=DEFAULT_MARGIN_DB):
+    """Find (start_ms, end_ms) regions of `audio` that contain speech.
+
+    The threshold sits `margin_db` above the noise floor (the 10th percentile
+    frame level) but never above 10 dB under the loud frames, so recordings
+    without pauses are kept whole.
+    """
+    levels = frame_levels(audio, frame_ms)
+    if not len(levels):
+        return [(0, len(audio))]
+    floor, loud = np.percentile(levels, [10, 90])
+    threshold = min(floor + margin_db, loud - 10)
+    active = levels > threshold
+
+    # Rising and falling edges of the active frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    regions = []
+    for start, end in zip(edges[::2] * frame_ms, edges[1::2] * frame_ms):
+        start, end = max(0, int(start) - padding_ms), min(len(audio), int(end) + padding_ms)
+        if regions and start - regions[-1][1] < min_silence_ms:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def trim_non_speech(audio_path, gap_ms=DEFAULT_GAP_MS, export_format="mp3", bitrate="64k", **detect_kwargs):
+    """Write a copy of the file without long non-speech stretches.
+
+    Returns (path, offset_map, report). `offset_map` is a list of
+    (trimmed_start_ms, original_start_ms, length_ms) for the kept regions and
+    `report` has original_ms, kept_ms and removed_pct. When too little would
+    be removed the original path is returned with an empty offset map.
+    """
+    audio = load_audio(audio_path)
+    original_ms = len(audio)
+    regions = speech_regions(audio, **detect_kwargs)
+    kept_ms = sum(end - start for start, end in regions) + gap_ms * max(0, len(regions) - 1)
+
+    if original_ms - kept_ms < MIN_REMOVED_MS:
+        return audio_path, [], {"original_ms": original_ms, "kept_ms": original_ms, "removed_pct": 0.0}
+
+    trimmed = AudioSegment.empty()
+    offset_map = []
+    for start, end in regions:
+        if offset_map:
+            trimmed += AudioSegment.silent(duration=gap_ms, frame_rate=audio.frame_rate)
+        offset_map.append((len(trimmed), start, end - start))
+        trimmed += audio[start:end]
+    del audio
+
+    with tempfile.NamedTemporaryFile(suffix=f".{export_format}", delete=False) as tmp:
+        trimmed.export(tmp, format=export_format, bitrate=bitrate)
+    report = {
+        "original_ms": original_ms,
+        "kept_ms": len(trimmed),
+        "removed_pct": round((1 - len(trimmed) / original_ms) * 100, 1) if original_ms else 0.0,
+    }
+    return tmp.name, offset_map, report
+
+
+def to_original_ms(offset_map, ms):
+    """Map a position in the trimmed audio back onto the original recording."""
+    if not offset_map:
+        return ms
+    idx = max(0, bisect.bisect_right([entry[0] for entry in offset_map], ms) - 1)
+    trimmed_start, original_start, length = offset_map[idx]
+    # Positions inside a pause left by a cut belong to the end of the region before it
+    return original_start + min(max(0, ms - trimmed_start), length)
+
+
+def reproject_timestamps(text, offset_map):
+    """Rewrite bracketed timestamps like [01:23] or (00:01:23 - 00:02:00) onto the original timeline."""
+    if not offset_map:
+        return text
+
+    def replace_time(match):
+        hours, minutes, seconds = match.groups()
+        ms = ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000
+        original = to_original_ms(offset_map, ms)
+        if hours is None and original < 3600 * 1000:
+            return f"{original // 60000:02d}:{original // 1000 % 60:02d}"
+        return format_timestamp(original)
+
+    return BRACKETED_RE.sub(lambda group: TIMESTAMP_RE.sub(replace_time, group.group()), text)